@@ -13,37 +13,38 @@ $(document).ready(function () {
         $(".input").val("");
 
         ///show after successfull call
+        $(".ai-response").text("");
+        $(".roadmap-link").hide();
         $(".response").show();
 
-        fetch("http://52.59.213.161:8080/chat", {
-            method: "POST",
-            body: JSON.stringify({ prompt: Prompt }),
-            headers: {
-                "Content-Type": "application/json",
-            },
-        })
-            .then((response) => response.json())
-            .then((data) => {
-                console.log(data);
-                fetch("http://52.59.213.161:8080/create_roadmap", {
-                    method: "POST",
-                    body: JSON.stringify(data),
-                    headers: {
-                        "Content-Type": "application/json",
-                    },
-                })
-                .then((response) => {
-                    console.log(response.status);
-                })
-                .then((data) => {
-                    console.log(data);
-                })
-                .catch((error) => {
-                    console.error("Error:", error);
-                });
-            })
-            .catch((error) => {
-                console.error("Error:", error);
-            });
+        // Stream the roadmap as it is generated; the server saves it
+        // once the stream closes and sends back its id
+        const url = "http://52.59.213.161:8080/chat/stream?prompt=" +
+            encodeURIComponent(Prompt);
+        const source = new EventSource(url);
+        let text = "";
+
+        source.addEventListener("delta", (event) => {
+            text += JSON.parse(event.data).content;
+            $(".ai-response").text(text);
+        });
+
+        source.addEventListener("done", (event) => {
+            source.close();
+            // a link rather than window.open: browsers block popups that
+            // do not come straight from a click
+            const roadmapId = JSON.parse(event.data).roadmap_id;
+            $(".roadmap-link")
+                .attr("href", "http://52.59.213.161:8080/roadmap/" + roadmapId)
+                .show();
+        });
+
+        source.addEventListener("error", (event) => {
+            source.close();
+            const message = event.data ? JSON.parse(event.data).error
+                : "connection to /chat/stream lost";
+            console.error("Error:", message);
+            $(".ai-response").text("Error: " + message);
+        });
         });
 });
\ No newline at end of file
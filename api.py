@@ -1,22 +1,22 @@
 #!/usr/bin/python3
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import openai
 from os import environ
 from flask import request
+from web_flask.llm.backends import backend_from_env
 
 
 app = Flask(__name__)
 CORS(app)
 
-client = openai.Client(
-    api_key = environ['OPENAI_API_KEY']
-)
+# same backends as web_flask/api.py (RDMP_LLM_BACKEND); the OpenAI client
+# is only created on the first request
+backend = backend_from_env()
 
 @app.route('/chat', methods=['POST'])
 def chat():
     data = request.get_json()
-    completion = client.chat.completions.create(
+    response = backend.complete(
         model = environ['OPENAI_MODEL_ID'],
         messages=[
             {"role": "system", "content": "Given the specific topic, generate a comprehensive learning roadmap in json format. This should include a title for the whole concept,an engaging introduction, a detailed organization of more than 2 topics and subtopics, learning objectives for each, numerous external links tailored to learners' preferences, time-based milestones, and optional additional information like tips and project ideas. Ensure the roadmap is flexible and diverse to adapt to various learners' needs and goals."},
@@ -24,8 +24,7 @@ def chat():
         ],
         max_tokens=1500,
     )
-    response = completion.choices[0].message.content
-    return jsonify(response)
+    return jsonify(str(response))
 
 @app.route('/test')
 def hello():
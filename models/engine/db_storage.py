@@ -79,6 +79,42 @@ class DBStorage:
         return len(objects)
 
 
+    def fetch_many(self, cls_name, ref_ids, chunk_size=500):
+        """Fetches the children of many parents at once.
+
+        Returns {parent_id: [children]} with an entry (possibly empty) for
+        every id in ref_ids, children ordered by position where the class
+        has one. The ids are sent chunk_size at a time, one IN query per
+        chunk, so a long id list never becomes one huge statement.
+        """
+        if isinstance(cls_name, str):
+            cls_name = eval(cls_name)
+        search = {
+            "Topic": "roadmap_id",
+            "Dashboard": "roadmap_id",
+            "Roadmap": "user_id",
+            "Review": "user_id",
+            "Objectives": "topic_id",
+            "Resources": "topic_id"
+        }.get(cls_name.__name__)
+        if search is None:
+            raise ValueError(f"Class {cls_name.__name__} has no parent")
+
+        column = getattr(cls_name, search)
+        order = [column]
+        if hasattr(cls_name, 'position'):
+            order.append(cls_name.position)
+        order += [cls_name.created_at, cls_name.id]
+
+        ref_ids = list(dict.fromkeys(ref_ids))
+        children = {ref_id: [] for ref_id in ref_ids}
+        for i in range(0, len(ref_ids), chunk_size):
+            query = self.__session.query(cls_name).filter(
+                column.in_(ref_ids[i:i + chunk_size])).order_by(*order)
+            for obj in query:
+                children[getattr(obj, search)].append(obj)
+        return children
+
     def new(self, obj):
         """Creates a new object"""
         self.__session.add(obj)
@@ -15,32 +15,146 @@ Models:
 
 Endpoints:
 - '/chat': For generating chat responses based on user prompts using OpenAI's chat model.
+- '/chat/stream': Streams the chat response as Server-Sent Events and saves the roadmap.
+- '/roadmaps/generate': Queues a roadmap to be generated in the background.
+- '/jobs/<job_id>': Reports the progress of a generation job.
 - '/dashboard': Renders the dashboard page displaying available roadmaps.
 - '/roadmap/<roadmap_id>': Renders the page for viewing a specific roadmap.
 - '/create_roadmap': Creates a new roadmap based on provided JSON data.
 - '/update_roadmap_status/<roadmap_id>': Updates the status of a roadmap (planning, in_progress, or completed).
+- '/metrics': Runtime metrics (connection pool, object and page caches, LLM cache and upstream,
+  job queue).
 - '/test': Endpoint for testing if the application is running.
 
 Environment Variables:
+- RDMP_LLM_BACKEND: Roadmap generator backend: openai (default), fixture (replays
+  RDMP_LLM_FIXTURE, text.json by default) or fake (fixture with RDMP_LLM_FAKE_LATENCY,
+  RDMP_LLM_FAKE_JITTER and RDMP_LLM_FAKE_CHUNK_DELAY seconds of delay).
 - OPENAI_API_KEY: API key for accessing OpenAI services.
 - OPENAI_MODEL_ID: ID of the OpenAI model used for generating chat responses.
+- OPENAI_BASE_URL: Optional API endpoint, e.g. the local stub in fake_openai.py.
+- RDMP_POOL_SIZE, RDMP_POOL_MAX_OVERFLOW, RDMP_POOL_RECYCLE, RDMP_POOL_TIMEOUT,
+  RDMP_POOL_PRE_PING: Database connection pool settings.
+- RDMP_OBJECT_CACHE, RDMP_OBJECT_CACHE_SIZE, RDMP_OBJECT_CACHE_TTL,
+  RDMP_OBJECT_CACHE_PATH: Cache of objects read by id (memory, sqlite or none).
+- RDMP_PAGE_CACHE, RDMP_PAGE_CACHE_SIZE, RDMP_PAGE_CACHE_PATH: Cache of rendered
+  roadmap pages (memory, sqlite or none).
+- RDMP_LLM_CACHE, RDMP_LLM_CACHE_SIZE, RDMP_LLM_CACHE_TTL, RDMP_LLM_CACHE_PATH:
+  Cache of model completions (memory, sqlite or none).
+- RDMP_LLM_COALESCE_TIMEOUT: Seconds a request waits on an identical one in flight.
+- RDMP_LLM_TIMEOUT, RDMP_LLM_MAX_ATTEMPTS, RDMP_LLM_RETRY_RATIO: Upstream deadline
+  in seconds, attempts per call and share of calls that may be retried.
+- RDMP_LLM_MAX_CONCURRENCY, RDMP_LLM_QUEUE_TIMEOUT: Most upstream calls at once and
+  how long a call waits for a slot.
+- RDMP_LLM_BREAKER_THRESHOLD, RDMP_LLM_BREAKER_RESET: Consecutive failures that open
+  the circuit breaker and seconds before it tries upstream again.
+- RDMP_JOB_WORKERS, RDMP_JOB_MAX_PENDING: Background generation worker threads
+  and the most jobs allowed to wait.
+
+Deployment:
+- The tables are created and migrated by `flask --app api init-schema` or
+  `./console.py` `init_schema`, run once per deploy before the workers start.
 """
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, abort, url_for
+from flask import Response, stream_with_context, make_response
 from flask_cors import CORS
-import openai
 import json
+import hashlib
+import threading
+from itertools import chain
 from os import environ, getenv
 from dotenv import load_dotenv
 from models import storage
+from models.engine.cache import make_cache
+from models.engine.db_storage import DBStorage
+from llm.cache import ResponseCache
+from llm.backends import backend_from_env, UpstreamError
+from llm.generator import RoadmapGenerator
+from llm.jobs import JobQueue, QueueFull
+from llm.singleflight import SingleFlight, CoalesceTimeout
+from llm.resilience import ResilientBackend, UpstreamUnavailable
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize OpenAI client
-client = openai.Client(api_key=getenv('OPENAI_API_KEY'))
+# Owner of generated roadmaps until user accounts exist
+DEFAULT_USER_ID = "6c970b0d-caed-4ff1-8eee-0ecf04ac7482"
+
+# Number of roadmaps shown per dashboard page
+DASHBOARD_PAGE_SIZE = int(getenv('RDMP_DASHBOARD_PAGE_SIZE', 30))
+# Columns the dashboard cards need; the introduction and extra info
+# are only loaded on the roadmap page
+DASHBOARD_FIELDS = ['id', 'title', 'created_at',
+                    'planning', 'in_progress', 'completed']
+
+# Roadmap generation on the backend chosen by RDMP_LLM_BACKEND, with a
+# cache of completions so repeated prompts skip the upstream call, and
+# identical prompts in flight share one call. Upstream calls have a
+# deadline, bounded retries, a concurrency limit and a circuit breaker
+generator = RoadmapGenerator(
+    ResilientBackend.from_env(backend_from_env()),
+    getenv('OPENAI_MODEL_ID'), ResponseCache.from_env(),
+    max_tokens=1000,
+    validate=DBStorage.validate_roadmap_payload,
+    flight=SingleFlight(
+        timeout=float(getenv('RDMP_LLM_COALESCE_TIMEOUT', 120)))
+)
+
+# Rendered roadmap pages, keyed by ETag
+page_cache = make_cache(getenv('RDMP_PAGE_CACHE', 'memory'),
+                        maxsize=int(getenv('RDMP_PAGE_CACHE_SIZE', 256)),
+                        path=getenv('RDMP_PAGE_CACHE_PATH',
+                                    'page_cache.sqlite3'))
+
+# Background generation jobs; unfinished jobs from a previous run resume
+# once each process serves its first request
+jobs = JobQueue(storage, generator, DEFAULT_USER_ID,
+                max_workers=int(getenv('RDMP_JOB_WORKERS', 4)),
+                max_pending=int(getenv('RDMP_JOB_MAX_PENDING', 100)))
+recovery_started = threading.Event()
+recovery_lock = threading.Lock()
+
+# Start queueing again the jobs a previous run left behind. WSGI servers
+# import this module without running the __main__ block, so this happens
+# on the first request of every process, in a thread of its own: requests
+# never wait on the database for it, or fail when it is down. claim_job()
+# keeps two processes from running the same job
+@app.before_request
+def recover_jobs():
+    if recovery_started.is_set():
+        return
+    with recovery_lock:
+        if not recovery_started.is_set():
+            jobs.start_recovery()
+            recovery_started.set()
+
+# Create the tables and migrate the data: flask --app api init-schema
+@app.cli.command('init-schema')
+def init_schema_command():
+    """Creates missing tables and indexes and migrates the data"""
+    storage.init_schema()
+
+# Answer requests that gave up waiting on an identical one with a 504
+@app.errorhandler(CoalesceTimeout)
+def coalesce_timeout(error):
+    return jsonify({'error': str(error)}), 504
+
+# Fail fast with a 503 while upstream is failing or saturated
+@app.errorhandler(UpstreamUnavailable)
+def upstream_unavailable(error):
+    return jsonify({'error': str(error)}), 503, \
+        {'Retry-After': str(error.retry_after)}
+
+# Report upstream failures that outlasted the retries
+@app.errorhandler(TimeoutError)
+@app.errorhandler(ConnectionError)
+@app.errorhandler(UpstreamError)
+def upstream_failed(error):
+    status = 504 if isinstance(error, TimeoutError) else 502
+    return jsonify({'error': f'Roadmap generation failed: {error}'}), status
 
-# Close the database connection at the end of each request
+# Release this request's database session at the end of each request
 @app.teardown_appcontext
 def db_close(exception):
     storage.close()
@@ -62,52 +176,163 @@ def chat():
     Generate chat responses based on user prompts using the OpenAI chat model.
     """
     data = request.get_json()
-    completion = client.chat.completions.create(
-        model=getenv('OPENAI_MODEL_ID'),
-        messages=[
-            {"role": "system", "content": "Given the specific topic, generate a comprehensive learning roadmap in json format. This should include a title for the whole concept, an engaging introduction, a detailed organization of topics and subtopics, learning objectives for each, numerous external links tailored to learners' preferences, time-based milestones, and optional additional information like tips and project ideas. Ensure the roadmap is flexible and diverse to adapt to various learners' needs and goals."},
-            {"role": "user", "content": data["prompt"]}
-        ],
-        max_tokens=1000,
-    )
-    response = completion.choices[0].message.content
-    return jsonify(response)
+    return jsonify(generator.complete(data["prompt"]))
+
+# Endpoint streaming chat responses as Server-Sent Events
+@app.route('/chat/stream', methods=['GET', 'POST'])
+def chat_stream():
+    """
+    Stream the generated roadmap token by token as Server-Sent Events.
+
+    The prompt comes from the `prompt` query parameter (so the browser's
+    EventSource can be used) or the JSON body. Each `delta` event carries
+    a piece of the completion; once the stream closes the roadmap is
+    saved and a `done` event carries its id, or an `error` event says
+    why it could not be saved.
+    """
+    if request.method == 'POST':
+        prompt = (request.get_json(silent=True) or {}).get('prompt')
+    else:
+        prompt = request.args.get('prompt')
+    if not prompt:
+        return jsonify({'error': 'Missing prompt'}), 400
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    # Wait for the first piece before answering, so an unavailable
+    # upstream gets a proper error status instead of an empty stream
+    deltas = generator.stream(prompt)
+    first = next(deltas, None)
+
+    def events():
+        parts = []
+        try:
+            for delta in chain([first] if first else [], deltas):
+                parts.append(delta)
+                yield sse('delta', {'content': delta})
+        except Exception as e:
+            yield sse('error', {'error': f'Generation failed: {e}'})
+            return
+
+        try:
+            ids = storage.bulk_ingest_roadmap(''.join(parts), DEFAULT_USER_ID)
+        except ValueError as e:
+            yield sse('error', {'error': str(e)})
+            return
+        yield sse('done', {'roadmap_id': ids[-1]})
+
+    return Response(stream_with_context(events()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache',
+                             'X-Accel-Buffering': 'no'})
+
+# Endpoint queueing a roadmap to be generated in the background
+@app.route('/roadmaps/generate', methods=['POST'])
+def generate_roadmap():
+    """
+    Queue the generation of a roadmap and return the job id at once.
+    """
+    prompt = (request.get_json(silent=True) or {}).get('prompt')
+    if not prompt:
+        return jsonify({'error': 'Missing prompt'}), 400
+    try:
+        job = jobs.submit(prompt)
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'job_id': job.id,
+                    'status_url': url_for('job_status', job_id=job.id)}), 202
+
+# Endpoint reporting the progress of a generation job
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    Report the status and progress of a roadmap generation job.
+    """
+    job = storage.get("Job", job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job_id': job.id,
+                    'status': job.status,
+                    'progress': job.progress,
+                    'roadmap_id': job.roadmap_id,
+                    'error': job.error,
+                    'created_at': job.created_at.isoformat(),
+                    'updated_at': job.updated_at.isoformat()})
 
 # Endpoint for rendering the dashboard page
 @app.route('/dashboard')
 def dashboard():
     """
     Render the dashboard page with a list of available roadmaps.
+
+    The counts in the header come from the user's dashboard counters,
+    not from counting roadmaps.
     """
-    roadmap = storage.all("Roadmap").values()
-    data = sorted(roadmap, key=lambda k: k.created_at, reverse=True)
-    return render_template('dashboard.html', data=data)
+    try:
+        data, prev_cursor, next_cursor = storage.paginate(
+            "Roadmap",
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+            limit=DASHBOARD_PAGE_SIZE,
+            fields=DASHBOARD_FIELDS
+        )
+    except ValueError as e:
+        abort(400, str(e))
+    return render_template('dashboard.html', data=data,
+                           counts=storage.dashboard_counts(DEFAULT_USER_ID),
+                           prev_cursor=prev_cursor, next_cursor=next_cursor)
 
 # Endpoint for viewing a specific roadmap
 @app.route('/roadmap/<roadmap_id>')
 def view_roadmap(roadmap_id):
     """
     Render the page for viewing a specific roadmap.
+
+    The page is validated with an ETag and Last-Modified derived from
+    the newest change in the roadmap tree: browsers revalidating an
+    unchanged roadmap get a 304, and rendered pages are cached by ETag,
+    so only a cheap freshness query runs until the roadmap is edited.
     """
-    roadmap = storage.show("Roadmap", roadmap_id)
-    topics = storage.fetch("Topic", roadmap.id)
-    objectives = []
-    resources = []
-
-    for i in topics.values():
-        o = storage.fetch("Objectives", i.id)
-        r = storage.fetch("Resources", i.id)
-        for obj in o.values():
-            objectives.append(obj)
-        for res in r.values():
-            resources.append(res)
-
-    return render_template('roadmap.html',
-                           roadmap=roadmap,
-                           objectives=objectives,
-                           topics=sorted(topics.values(), key=lambda t: t.position),
-                           resources=resources
-                           )
+    version = storage.roadmap_version(roadmap_id)
+    if version is None:
+        abort(404)
+    updated_at, rows = version
+    etag = hashlib.sha1(
+        f"{roadmap_id}|{updated_at.isoformat()}|{rows}".encode()).hexdigest()
+    last_modified = updated_at.replace(microsecond=0)
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = request.if_modified_since is not None and \
+            request.if_modified_since.replace(tzinfo=None) >= last_modified
+    if fresh:
+        response = Response(status=304)
+    else:
+        html = page_cache.get(etag) if page_cache is not None else None
+        if html is None:
+            roadmap = storage.load_roadmap_graph(roadmap_id)
+            if roadmap is None:
+                abort(404)
+            # One pass over the tree: each topic with its own objectives
+            # and resources, so the template never scans other topics'
+            sections = [{'topic': topic,
+                         'objectives': topic.objectives,
+                         'resources': topic.resources}
+                        for topic in roadmap.topic]
+            html = render_template('roadmap.html',
+                                   roadmap=roadmap,
+                                   sections=sections
+                                   )
+            if page_cache is not None:
+                page_cache.set(etag, html)
+        response = make_response(html)
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
 
 # Endpoint for creating a new roadmap
 @app.route('/create_roadmap', methods=['POST'])
@@ -115,81 +340,30 @@ def create_roadmap():
     """
     Create a new roadmap based on the provided JSON data.
     """
-    from models.roadmap import Roadmap
-    from models.topics import Topic
-    from models.resources import Resources
-    from models.objectives import Objectives
-
-    response = json.loads(request.get_json())
-    roadmap_response = response.values()
-
-    for data in roadmap_response:
-        roadmap_data = {
-            'user_id': "6c970b0d-caed-4ff1-8eee-0ecf04ac7482",
-            'title': data['Title'],
-            'introduction': data['Introduction'],
-            'AdditionalInfo': data['AdditionalInfo'],
-            'planning': True,
-            'in_progress': False,
-            'completed': False
-        }
-        roadmap = Roadmap(**roadmap_data)
-        roadmap.save()
-        r_id = roadmap.id
-
-        position = 1
-        for topic_data in data["Topics"]:
-            topic = Topic(
-                position=position,
-                roadmap_id=roadmap.id,
-                name=topic_data['TopicName'],
-                description=topic_data['Descriptions'],
-                milestones=topic_data['Milestones']
-            )
-            position += 1
-
-            for objective_text in topic_data['LearningObjectives']:
-                objective = Objectives(name=objective_text, topic_id=topic.id)
-                topic.objectives.append(objective)
-                objective.save()
-
-            for resource_link in topic_data['Resources']:
-                resource = Resources(link=resource_link, topic_id=topic.id)
-                topic.resources.append(resource)
-                resource.save()
-
-            roadmap.topic.append(topic)
-            topic.save()
-
-    return f"{r_id}"
+    try:
+        ids = storage.bulk_ingest_roadmap(request.get_json(), DEFAULT_USER_ID)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return f"{ids[-1]}"
 
 # Endpoint for updating the status of a roadmap
 @app.route('/update_roadmap_status/<roadmap_id>', methods=['PUT'])
 def update_roadmap_status(roadmap_id):
     """
     Update the status of a roadmap (planning, in_progress, or completed).
+
+    The move is a single UPDATE of the roadmap row, so concurrent moves
+    of the same card cannot interleave and nothing is loaded first.
     """
+    new_status = (request.get_json(silent=True) or {}).get('new_status')
     try:
-        roadmap = storage.get("Roadmap", roadmap_id)
-        new_status = request.json.get('new_status')
-
-        if new_status == 'planning':
-            roadmap.planning = True
-            roadmap.in_progress = False
-            roadmap.completed = False
-        elif new_status == 'in_progress':
-            roadmap.in_progress = True
-            roadmap.planning = False
-            roadmap.completed = False
-        elif new_status == 'completed':
-            roadmap.completed = True
-            roadmap.planning = False
-            roadmap.in_progress = False
-
-        roadmap.save()
-        return jsonify({'message': 'Roadmap status updated successfully'}), 200
-    except Exception as e:
-        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+        updated = storage.set_roadmap_status(roadmap_id, new_status)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not updated:
+        return jsonify({'error': 'Roadmap not found'}), 404
+    return jsonify({'message': 'Roadmap status updated successfully'}), 200
 
 @app.route('/profile')
 def profile_page():
@@ -201,10 +375,28 @@ def settings_page():
     """ """
     return render_template('settings.html')
 
+# Endpoint exposing runtime metrics
+@app.route('/metrics')
+def metrics():
+    """
+    Return connection pool usage, object and page cache counters, LLM cache, coalescing and upstream
+    counters (including the circuit breaker state) and job queue usage
+    as JSON.
+    """
+    return jsonify({'pool': storage.pool_stats(),
+                    'object_cache': storage.cache_stats(),
+                    'page_cache': page_cache.stats() if page_cache else
+                    {'enabled': False},
+                    'llm_cache': generator.cache.stats(),
+                    'llm_coalescing': generator.flight.stats(),
+                    'llm_upstream': generator.backend.stats(),
+                    'jobs': jobs.stats()})
+
 # Test endpoint
 @app.route('/test')
 def hello():
     return "Hello, this is working"
 
 if __name__ == "__main__":
-    app.run(debug=True, port=8080, host="0.0.0.0")
+    storage.init_schema()
+    app.run(debug=True, port=8080, host="0.0.0.0", threaded=True)
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+"""
+File: bench.py
+Description: Offline end-to-end throughput benchmark of /chat followed by
+/create_roadmap, the flow the chat page runs.
+
+The app is driven in-process through Flask's test client, with the
+roadmap generator on the fake backend (RDMP_LLM_BACKEND=fake unless set
+otherwise), so no network access or API key is needed. Roadmaps are
+written to the database configured by the RDMP_MYSQL_* variables.
+
+Usage:
+    ./bench.py [--requests 200] [--concurrency 16] [--prompts 20]
+"""
+import argparse
+import os
+import threading
+import time
+
+os.environ.setdefault('RDMP_LLM_BACKEND', 'fake')
+os.environ.setdefault('RDMP_LLM_FAKE_LATENCY', '0.5')
+
+
+def main():
+    """Runs the benchmark and prints throughput and latencies"""
+    parser = argparse.ArgumentParser(
+        description='Offline throughput benchmark of /chat + /create_roadmap')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--prompts', type=int, default=20,
+                        help='number of distinct prompts to cycle through')
+    args = parser.parse_args()
+
+    from api import app
+    from models import storage
+    storage.init_schema()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker():
+        client = app.test_client()
+        for i in counter:
+            prompt = f"Learning roadmap number {i % args.prompts}"
+            start = time.perf_counter()
+            chat = client.post('/chat', json={'prompt': prompt})
+            created = client.post('/create_roadmap', json=chat.get_json())
+            elapsed = time.perf_counter() - start
+            with lock:
+                if chat.status_code != 200 or created.status_code != 200:
+                    errors.append((chat.status_code, created.status_code))
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker)
+               for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    print(f"requests:    {len(latencies)} ({len(errors)} errors)")
+    print(f"concurrency: {args.concurrency}")
+    print(f"throughput:  {len(latencies) / total:.1f} req/s")
+    print(f"latency p50: {percentile(0.50) * 1000:.1f} ms")
+    print(f"latency p95: {percentile(0.95) * 1000:.1f} ms")
+    print(f"latency p99: {percentile(0.99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
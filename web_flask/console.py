@@ -2,8 +2,13 @@
 """ Console Module """
 import cmd
 import sys
+import gzip
+import json
+import time
+from itertools import groupby
+from sqlalchemy.exc import SQLAlchemyError
 from models.basemodel import BaseModel
-from models.__init__ import storage
+from models import storage
 from models.user import User
 from models.dashboard import Dashboard
 from models.roadmap import Roadmap
@@ -11,6 +16,7 @@ from models.reviews import Review
 from models.topics import Topic
 from models.resources import Resources
 from models.objectives import Objectives
+from models.job import Job
 
 
 class RDMPCommand(cmd.Cmd):
@@ -22,10 +28,19 @@ class RDMPCommand(cmd.Cmd):
     classes = {
                'BaseModel': BaseModel, 'User': User, 'Roadmap': Roadmap,
                'Dashboard': Dashboard, 'Review': Review, 'Topic': Topic,
-               'Resources': Resources, 'Objectives': Objectives
+               'Resources': Resources, 'Objectives': Objectives, 'Job': Job
                }
+    # parents before children, so an import never breaks a foreign key
+    export_order = ['User', 'Roadmap', 'Dashboard', 'Review', 'Topic',
+                    'Objectives', 'Resources', 'Job']
     dot_cmds = ['all', 'count', 'show', 'destroy', 'update']
-    types = {'planning': int, 'in_progress': int, 'completed': int}
+    types = {'planning': int, 'in_progress': int, 'completed': int,
+             'status': int}
+
+    @staticmethod
+    def stored(c_name):
+        """ Whether a class has a table, so instances in storage """
+        return hasattr(RDMPCommand.classes[c_name], '__table__')
 
     def preloop(self):
         """Prints if isatty is false"""
@@ -163,6 +178,8 @@ class RDMPCommand(cmd.Cmd):
         key = c_name + "." + c_id
         try:
             # print(storage._FileStorage__objects[key])
+            if not RDMPCommand.stored(c_name):
+                raise KeyError
             object = storage.show(c_name, c_id)
             if object is None:
                 raise KeyError
@@ -195,13 +212,15 @@ class RDMPCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-
         try:
-            del storage.all()[key]
+            if not RDMPCommand.stored(c_name) or \
+                    not storage.delete_by_id(c_name, c_id):
+                print("** no instance found **")
+                return
             storage.save()
-        except KeyError:
-            print("** no instance found **")
+        except SQLAlchemyError as e:
+            storage.rollback()
+            print(f"** {e} **")
 
     def help_destroy(self):
         """ Help information for the destroy command """
@@ -210,22 +229,26 @@ class RDMPCommand(cmd.Cmd):
 
     def do_all(self, args):
         """ Shows all objects, or all objects of a class"""
-        print_list = []
-
         if args:
             args = args.split(' ')[0]
             if args not in RDMPCommand.classes:
                 print("** class doesn't exist **")
                 return
-            objects = storage.all(RDMPCommand.classes[args])
-            for obj in objects.values():
-                print_list.append(str(obj))
+            classes = [args] if RDMPCommand.stored(args) else []
         else:
-            objects = storage.all()
-            for obj in objects.values():
-                print_list.append(str(obj))
-
-        print(print_list)
+            classes = [c for c in RDMPCommand.classes
+                       if RDMPCommand.stored(c)]
+
+        # rows are printed as they are read, in the format of a printed
+        # list, instead of collecting every row first
+        separator = ''
+        print('[', end='')
+        for c_name in classes:
+            for row in storage.summaries(c_name, lazy=True):
+                line = f"[{c_name}] ({row.id}) {dict(row._mapping)}"
+                print(separator + repr(line), end='')
+                separator = ', '
+        print(']')
 
     def help_all(self):
         """ Help information for the all command """
@@ -274,11 +297,10 @@ class RDMPCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        # generate key from class and id
-        key = c_name + "." + c_id
-
-        # determine if key is present
-        if key not in storage.all():
+        # look up the instance
+        new_dict = storage.get(c_name, c_id) \
+            if RDMPCommand.stored(c_name) else None
+        if new_dict is None:
             print("** no instance found **")
             return
 
@@ -311,9 +333,6 @@ class RDMPCommand(cmd.Cmd):
 
             args = [att_name, att_val]
 
-        # retrieve dictionary of current objects
-        new_dict = storage.all()[key]
-
         # iterate through attr names and values
         for i, att_name in enumerate(args):
             # block only runs on even iterations
@@ -325,20 +344,125 @@ class RDMPCommand(cmd.Cmd):
                 if not att_val:  # check for att_value
                     print("** value missing **")
                     return
-                # type cast as necessary
-                if att_name in RDMPCommand.types:
-                    att_val = RDMPCommand.types[att_name](att_val)
-
-                # update dictionary with name, value pair
-                new_dict.__dict__.update({att_name: att_val})
+                # type cast as necessary, and update the instance with
+                # name, value pair; invalid values discard the update
+                try:
+                    if att_name in RDMPCommand.types:
+                        att_val = RDMPCommand.types[att_name](att_val)
+                    setattr(new_dict, att_name, att_val)
+                except ValueError as e:
+                    storage.rollback()
+                    print(f"** {e} **")
+                    return
 
-        new_dict.save()  # save updates to file
+        try:
+            new_dict.save()  # save updates to file
+        except SQLAlchemyError as e:
+            storage.rollback()
+            print(f"** {e} **")
 
     def help_update(self):
         """ Help information for the update class """
         print("Updates an object with new information")
         print("Usage: update <className> <id> <attName> <attVal>\n")
 
+    def do_init_schema(self, args):
+        """ Creates the tables and applies the migrations """
+        storage.init_schema()
+
+    def help_init_schema(self):
+        """ Help information for the init_schema command """
+        print("Creates missing tables and indexes and migrates the data")
+        print("of earlier versions")
+        print("[Usage]: init_schema\n")
+
+    def do_recount(self, args):
+        """ Rebuilds the dashboard counters from the roadmaps """
+        user_ids = args.split() or None
+        print(storage.recount_dashboards(user_ids))
+
+    def help_recount(self):
+        """ Help information for the recount command """
+        print("Recounts the roadmaps of every user, or of the given users,")
+        print("in each status and rewrites their dashboard counters")
+        print("[Usage]: recount [<userId> ...]\n")
+
+    def do_export(self, args):
+        """ Streams objects to a gzipped NDJSON file """
+        args = args.split()
+        if not args:
+            print("** file name missing **")
+            return
+        path, c_names = args[0], args[1:] or RDMPCommand.export_order
+        for c_name in c_names:
+            if c_name not in RDMPCommand.export_order:
+                print("** class doesn't exist **")
+                return
+
+        # datetimes are the only values json cannot encode by itself
+        encode = json.JSONEncoder(default=lambda v: v.isoformat()).encode
+
+        start = time.perf_counter()
+        total = 0
+        # the fastest compression level: the output is still several
+        # times smaller, and level 9 would triple the export time
+        with gzip.open(path, 'wt', encoding='utf-8', compresslevel=1) as f:
+            for c_name in c_names:
+                for row in storage.iter_all(c_name):
+                    row['__class__'] = c_name
+                    f.write(encode(row) + '\n')
+                    total += 1
+        print(f"{total} objects exported to {path} "
+              f"in {time.perf_counter() - start:.1f}s")
+
+    def help_export(self):
+        """ Help information for the export command """
+        print("Writes all objects, or all of the given classes, to a")
+        print("gzipped file with one JSON object per line")
+        print("[Usage]: export <file> [<className> ...]\n")
+
+    def do_import(self, args):
+        """ Loads objects from a gzipped NDJSON file """
+        path = args.split(' ')[0]
+        if not path:
+            print("** file name missing **")
+            return
+
+        def rows(f):
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    row = json.loads(line)
+                    if '__class__' not in row:
+                        raise ValueError(f"line {number} has no __class__")
+                    yield row.pop('__class__'), row
+
+        # every class goes in one transaction: on any error the database
+        # is left as it was
+        start = time.perf_counter()
+        total = 0
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for c_name, group in groupby(rows(f), key=lambda r: r[0]):
+                    if c_name not in RDMPCommand.export_order:
+                        storage.rollback()
+                        print("** class doesn't exist **")
+                        return
+                    total += storage.bulk_insert(
+                        c_name, (row for _, row in group), commit=False)
+            storage.save()
+        except (OSError, ValueError, SQLAlchemyError) as e:
+            storage.rollback()
+            print(f"** {e} **")
+            return
+        print(f"{total} objects imported from {path} "
+              f"in {time.perf_counter() - start:.1f}s")
+
+    def help_import(self):
+        """ Help information for the import command """
+        print("Inserts the objects of a file written by export, all or")
+        print("none of them")
+        print("[Usage]: import <file>\n")
+
 
 if __name__ == "__main__":
     RDMPCommand().cmdloop()
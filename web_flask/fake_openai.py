@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+"""
+File: fake_openai.py
+Description: A local stand-in for the OpenAI chat completions API, so the
+roadmap endpoints can be exercised offline.
+
+It answers POST /v1/chat/completions with the roadmap in a fixture file
+(text.json by default), either as one completion or, when the request
+asks for `stream`, as Server-Sent Event chunks in OpenAI's format.
+
+Usage:
+    ./fake_openai.py [--port 8081] [--fixture text.json]
+                     [--latency 0] [--chunk-size 16] [--chunk-delay 0.01]
+
+Then start the app with OPENAI_BASE_URL=http://localhost:8081/v1 and any
+OPENAI_API_KEY.
+"""
+import argparse
+import json
+import time
+import uuid
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+settings = {'content': '', 'latency': 0.0, 'chunk_size': 16,
+            'chunk_delay': 0.01}
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def completions():
+    """Replays the fixture as a chat completion"""
+    data = request.get_json()
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    model = data.get('model') or 'fake-model'
+    content = settings['content']
+    time.sleep(settings['latency'])
+
+    if not data.get('stream'):
+        return jsonify({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': created,
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0,
+                      'total_tokens': 0}
+        })
+
+    def chunk(delta, finish_reason=None):
+        body = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': created,
+            'model': model,
+            'choices': [{'index': 0, 'delta': delta,
+                         'finish_reason': finish_reason}]
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    def events():
+        yield chunk({'role': 'assistant', 'content': ''})
+        size = settings['chunk_size']
+        for i in range(0, len(content), size):
+            yield chunk({'content': content[i:i + size]})
+            time.sleep(settings['chunk_delay'])
+        yield chunk({}, 'stop')
+        yield "data: [DONE]\n\n"
+
+    return Response(events(), mimetype='text/event-stream')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Local stand-in for the OpenAI chat completions API')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--fixture', default='text.json')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds to wait before answering')
+    parser.add_argument('--chunk-size', type=int, default=16,
+                        help='characters per streamed chunk')
+    parser.add_argument('--chunk-delay', type=float, default=0.01,
+                        help='seconds between streamed chunks')
+    args = parser.parse_args()
+
+    with open(args.fixture) as f:
+        settings['content'] = json.dumps(json.load(f))
+    settings.update(latency=args.latency, chunk_size=args.chunk_size,
+                    chunk_delay=args.chunk_delay)
+    app.run(port=args.port, threaded=True)
@@ -0,0 +1,2 @@
+#!/usr/bin/python3
+"""Helpers around the language model that generates roadmaps"""
@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+"""Chat completion backends the roadmap generator can run on"""
+import hashlib
+import json
+import os
+import random
+import time
+
+# the roadmap in web_flask/text.json, wherever the app is started from
+DEFAULT_FIXTURE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'text.json')
+
+
+class UpstreamError(Exception):
+    """A failure of the upstream service worth retrying, such as a rate
+    limit or a server error. Timeouts are reported as TimeoutError and
+    network failures as ConnectionError."""
+
+
+class Completion(str):
+    """Completion text that also carries why the model stopped: 'stop'
+    when it finished, 'length' when it ran out of tokens, None when the
+    backend cannot tell"""
+
+    def __new__(cls, text, finish_reason=None):
+        """Initialization"""
+        completion = super().__new__(cls, text)
+        completion.finish_reason = finish_reason
+        return completion
+
+
+class Backend:
+    """Interface of a chat completion backend.
+
+    `timeout` is the deadline in seconds for the answer (for a stream,
+    for its first piece); past it the backend raises TimeoutError.
+    """
+
+    def complete(self, messages, model, max_tokens, timeout=None):
+        """Returns the whole completion as a Completion"""
+        raise NotImplementedError
+
+    def stream(self, messages, model, max_tokens, timeout=None):
+        """Yields the completion text piece by piece, then returns the
+        finish reason (the generator's return value)"""
+        raise NotImplementedError
+
+
+class OpenAIBackend(Backend):
+    """The OpenAI chat completions API.
+
+    The client is created on first use, so the app can be imported
+    without the openai package or an API key. Its own retries are turned
+    off and its errors are translated to the ones in this module, so
+    retrying is left to the caller.
+    """
+
+    def __init__(self, api_key=None, base_url=None):
+        """Initialization"""
+        self.api_key = api_key
+        self.base_url = base_url
+        self.__client = None
+
+    @property
+    def client(self):
+        """The OpenAI client"""
+        if self.__client is None:
+            import openai
+            self.__client = openai.Client(api_key=self.api_key,
+                                          base_url=self.base_url,
+                                          max_retries=0)
+        return self.__client
+
+    def __create(self, **kwargs):
+        """Calls the API, translating its errors"""
+        import openai
+        try:
+            return self.client.chat.completions.create(**kwargs)
+        except openai.APITimeoutError as e:
+            raise TimeoutError(str(e)) from e
+        except openai.APIConnectionError as e:
+            raise ConnectionError(str(e)) from e
+        except (openai.RateLimitError, openai.InternalServerError) as e:
+            raise UpstreamError(str(e)) from e
+
+    def complete(self, messages, model, max_tokens, timeout=None):
+        """Returns the whole completion text"""
+        completion = self.__create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            timeout=timeout,
+        )
+        choice = completion.choices[0]
+        return Completion(choice.message.content, choice.finish_reason)
+
+    def stream(self, messages, model, max_tokens, timeout=None):
+        """Yields the completion text piece by piece, then returns the
+        finish reason"""
+        stream = self.__create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            stream=True,
+        )
+        finish_reason = None
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+        return finish_reason
+
+
+class FixtureBackend(Backend):
+    """Replays canned roadmaps in the format of text.json.
+
+    `path` is a JSON file or a directory of them. With a directory, the
+    fixture is picked from a hash of the prompt, so the same prompt
+    always gets the same roadmap.
+    """
+
+    def __init__(self, path=DEFAULT_FIXTURE, chunk_size=16):
+        """Initialization"""
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name)
+                           for name in os.listdir(path)
+                           if name.endswith('.json'))
+        else:
+            files = [path]
+        if not files:
+            raise ValueError(f"No fixtures found in {path}")
+        self.fixtures = []
+        for name in files:
+            with open(name) as f:
+                self.fixtures.append(json.dumps(json.load(f)))
+        self.chunk_size = chunk_size
+
+    def pick(self, messages):
+        """Returns the fixture answering a conversation"""
+        prompt = messages[-1]['content']
+        digest = hashlib.sha256(prompt.encode()).digest()
+        return self.fixtures[digest[0] % len(self.fixtures)]
+
+    def complete(self, messages, model, max_tokens, timeout=None):
+        """Returns the whole completion text"""
+        return Completion(self.pick(messages), 'stop')
+
+    def stream(self, messages, model, max_tokens, timeout=None):
+        """Yields the completion text in chunk_size pieces"""
+        content = self.pick(messages)
+        for i in range(0, len(content), self.chunk_size):
+            yield content[i:i + self.chunk_size]
+        return 'stop'
+
+
+class FakeBackend(FixtureBackend):
+    """A fixture backend that behaves like a slow upstream: it waits
+    `latency` seconds (plus up to `jitter`) before answering and
+    `chunk_delay` seconds between streamed chunks. The jitter comes from
+    a seeded generator so runs are reproducible."""
+
+    def __init__(self, path=DEFAULT_FIXTURE, latency=1.0, jitter=0.0,
+                 chunk_delay=0.01, chunk_size=16, seed=0):
+        """Initialization"""
+        super().__init__(path, chunk_size)
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.__random = random.Random(seed)
+
+    def wait(self, timeout=None):
+        """Sleeps for the simulated upstream latency, raising TimeoutError
+        if that is longer than the timeout"""
+        delay = self.latency + self.__random.uniform(0, self.jitter)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"No answer within {timeout}s")
+        time.sleep(delay)
+
+    def complete(self, messages, model, max_tokens, timeout=None):
+        """Returns the whole completion text after the latency"""
+        self.wait(timeout)
+        return super().complete(messages, model, max_tokens)
+
+    def stream(self, messages, model, max_tokens, timeout=None):
+        """Yields the completion text with delays between chunks"""
+        self.wait(timeout)
+        stream = super().stream(messages, model, max_tokens)
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                return stop.value
+            yield chunk
+            time.sleep(self.chunk_delay)
+
+
+def backend_from_env():
+    """Builds the backend named by RDMP_LLM_BACKEND:
+    openai (default) uses OPENAI_API_KEY and OPENAI_BASE_URL;
+    fixture replays RDMP_LLM_FIXTURE (a file or directory, web_flask/
+    text.json by default); fake does the same with RDMP_LLM_FAKE_LATENCY,
+    RDMP_LLM_FAKE_JITTER and RDMP_LLM_FAKE_CHUNK_DELAY seconds of delay"""
+    name = os.getenv('RDMP_LLM_BACKEND', 'openai').lower()
+    fixture = os.getenv('RDMP_LLM_FIXTURE', DEFAULT_FIXTURE)
+    if name == 'openai':
+        return OpenAIBackend(api_key=os.getenv('OPENAI_API_KEY'),
+                             base_url=os.getenv('OPENAI_BASE_URL'))
+    if name == 'fixture':
+        return FixtureBackend(fixture)
+    if name == 'fake':
+        return FakeBackend(
+            fixture,
+            latency=float(os.getenv('RDMP_LLM_FAKE_LATENCY', 1.0)),
+            jitter=float(os.getenv('RDMP_LLM_FAKE_JITTER', 0.0)),
+            chunk_delay=float(os.getenv('RDMP_LLM_FAKE_CHUNK_DELAY', 0.01))
+        )
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+"""Content-addressed cache of model completions"""
+import hashlib
+import json
+import os
+from models.engine.cache import make_cache
+
+
+class ResponseCache:
+    """Caches completions keyed on everything that determines them:
+    the normalised prompt, the model id, the system prompt and
+    max_tokens. Two prompts differing only in case or spacing share an
+    entry.
+    """
+
+    def __init__(self, backend=None):
+        """Initialization; a None backend disables caching"""
+        self.backend = backend
+
+    @classmethod
+    def from_env(cls):
+        """Builds the cache configured by the environment:
+        RDMP_LLM_CACHE (memory, sqlite or none; default memory),
+        RDMP_LLM_CACHE_SIZE (entries), RDMP_LLM_CACHE_TTL (seconds) and
+        RDMP_LLM_CACHE_PATH (file used by the sqlite backend)"""
+        return cls(make_cache(
+            os.getenv('RDMP_LLM_CACHE', 'memory'),
+            maxsize=int(os.getenv('RDMP_LLM_CACHE_SIZE', 1024)),
+            ttl=float(os.getenv('RDMP_LLM_CACHE_TTL', 24 * 3600)),
+            path=os.getenv('RDMP_LLM_CACHE_PATH', 'llm_cache.sqlite3')
+        ))
+
+    @staticmethod
+    def normalise(prompt):
+        """Folds case and whitespace so equivalent prompts match"""
+        return ' '.join(prompt.lower().split())
+
+    def key(self, prompt, model, system_prompt, max_tokens):
+        """Returns the cache key of a completion request"""
+        material = json.dumps([self.normalise(prompt), model,
+                               system_prompt, max_tokens])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key):
+        """Returns the cached completion, or None"""
+        if self.backend is None:
+            return None
+        return self.backend.get(key)
+
+    def set(self, key, response):
+        """Stores a completion"""
+        if self.backend is not None:
+            self.backend.set(key, response)
+
+    def stats(self):
+        """Returns the backend's hit/miss counters"""
+        if self.backend is None:
+            return {'enabled': False}
+        return dict(self.backend.stats(), enabled=True,
+                    backend=type(self.backend).__name__)
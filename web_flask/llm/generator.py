@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+"""Generates roadmap JSON from a learner's prompt"""
+import json
+from llm.singleflight import SingleFlight
+
+SYSTEM_PROMPT = "Given the specific topic, generate a comprehensive learning roadmap in json format. This should include a title for the whole concept, an engaging introduction, a detailed organization of topics and subtopics, learning objectives for each, numerous external links tailored to learners' preferences, time-based milestones, and optional additional information like tips and project ideas. Ensure the roadmap is flexible and diverse to adapt to various learners' needs and goals."
+
+
+class RoadmapGenerator:
+    """Asks the chat model for a roadmap, going through the response
+    cache first. Shared by the request handlers and the job workers.
+
+    Concurrent complete() calls for the same cache key are coalesced
+    into one upstream request.
+
+    Only completions the model finished (finish reason 'stop') and that
+    pass `validate` are cached, so a truncated or malformed roadmap is
+    not served again to every retry of the prompt. `validate` raises
+    ValueError on a bad completion; by default it only checks for JSON.
+    """
+
+    def __init__(self, backend, model, cache, system_prompt=SYSTEM_PROMPT,
+                 max_tokens=1000, flight=None, validate=json.loads):
+        """Initialization"""
+        self.backend = backend
+        self.model = model
+        self.cache = cache
+        self.flight = flight or SingleFlight()
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.validate = validate
+
+    def key(self, prompt):
+        """Returns the cache key of a prompt"""
+        return self.cache.key(prompt, self.model, self.system_prompt,
+                              self.max_tokens)
+
+    def messages(self, prompt):
+        """Returns the chat messages sent for a prompt"""
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    def complete(self, prompt):
+        """Returns the whole completion for a prompt"""
+        key = self.key(prompt)
+        response = self.cache.get(key)
+        if response is None:
+            response = self.flight.do(key, self.__fetch, key, prompt)
+        return response
+
+    def __fetch(self, key, prompt):
+        """Requests a completion upstream and caches it if it is good"""
+        response = self.backend.complete(self.messages(prompt), self.model,
+                                         self.max_tokens)
+        self.__store(key, response,
+                     getattr(response, 'finish_reason', None))
+        return response
+
+    def __store(self, key, response, finish_reason):
+        """Caches a completion, unless it was cut short or is invalid"""
+        if finish_reason != 'stop':
+            return
+        try:
+            self.validate(response)
+        except ValueError:
+            return
+        self.cache.set(key, str(response))
+
+    @staticmethod
+    def __relay(stream, parts):
+        """Yields the pieces of a stream, keeping them in parts, and
+        returns the stream's return value"""
+        while True:
+            try:
+                delta = next(stream)
+            except StopIteration as stop:
+                return stop.value
+            parts.append(delta)
+            yield delta
+
+    def stream(self, prompt):
+        """Yields the completion for a prompt piece by piece as the model
+        produces it. A cached completion is yielded in one piece"""
+        key = self.key(prompt)
+        response = self.cache.get(key)
+        if response is not None:
+            yield response
+            return
+
+        parts = []
+        finish_reason = yield from self.__relay(
+            self.backend.stream(self.messages(prompt), self.model,
+                                self.max_tokens), parts)
+        self.__store(key, ''.join(parts), finish_reason)
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+"""Background roadmap generation"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import SQLAlchemyError
+from models.job import Job
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+class JobQueue:
+    """Runs roadmap generation on a bounded pool of worker threads.
+
+    Each job is a row of the jobs table, so a client can poll its
+    progress and jobs left unfinished by a restart are picked up again
+    by recover(). A job is claimed with a conditional UPDATE, so two
+    processes recovering the same table never run it twice.
+    """
+
+    def __init__(self, storage, generator, user_id, max_workers=4,
+                 max_pending=100):
+        """Initialization"""
+        self.storage = storage
+        self.generator = generator
+        self.user_id = user_id
+        self.max_pending = max_pending
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers,
+                                             thread_name_prefix='rdmp-job')
+        self.__pending = 0
+        self.__lock = threading.Lock()
+
+    def submit(self, prompt):
+        """Records a job for a prompt and queues it; returns the Job.
+        Raises QueueFull when max_pending jobs are already waiting"""
+        with self.__lock:
+            if self.__pending >= self.max_pending:
+                raise QueueFull("Too many roadmaps are being generated")
+            self.__pending += 1
+        try:
+            job = Job(prompt=prompt, status=Job.QUEUED, progress=0)
+            job.save()
+            self.__executor.submit(self.__run, job.id)
+        except Exception:
+            with self.__lock:
+                self.__pending -= 1
+            raise
+        return job
+
+    def recover(self, stale_after=600):
+        """Queues again the jobs a previous run left queued, or running
+        with no progress for `stale_after` seconds"""
+        job_ids = self.storage.requeue_stale_jobs(stale_after)
+        with self.__lock:
+            self.__pending += len(job_ids)
+        for job_id in job_ids:
+            self.__executor.submit(self.__run, job_id)
+        return job_ids
+
+    def start_recovery(self, stale_after=600, delay=1.0, max_delay=60.0):
+        """Runs recover() in a background thread and returns the thread.
+        While the database cannot be reached it tries again, waiting
+        twice as long each time, from `delay` up to `max_delay` seconds"""
+        def run():
+            wait = delay
+            while True:
+                try:
+                    job_ids = self.recover(stale_after)
+                    log.info("recovered %d jobs", len(job_ids))
+                    return
+                except SQLAlchemyError as e:
+                    log.warning("job recovery failed, retrying in %.1fs: "
+                                "%s", wait, e)
+                except Exception:
+                    log.exception("job recovery failed")
+                    return
+                finally:
+                    self.storage.close()
+                time.sleep(wait)
+                wait = min(wait * 2, max_delay)
+
+        thread = threading.Thread(target=run, name='rdmp-job-recovery',
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        """Returns the number of jobs waiting or running here"""
+        with self.__lock:
+            return {'pending': self.__pending,
+                    'max_pending': self.max_pending}
+
+    def __update(self, job_id, **values):
+        """Writes new values on a job"""
+        job = self.storage.show("Job", job_id)
+        for key, value in values.items():
+            setattr(job, key, value)
+        job.save()
+
+    def __run(self, job_id):
+        """Generates and saves the roadmap of one job"""
+        try:
+            if not self.storage.claim_job(job_id):
+                return
+            self.__update(job_id, progress=10)
+            prompt = self.storage.show("Job", job_id).prompt
+            response = self.generator.complete(prompt)
+            self.__update(job_id, progress=70)
+            ids = self.storage.bulk_ingest_roadmap(response, self.user_id)
+            self.__update(job_id, status=Job.SUCCEEDED, progress=100,
+                          roadmap_id=ids[-1])
+        except Exception as e:
+            self.storage.rollback()
+            self.__update(job_id, status=Job.FAILED, error=str(e))
+        finally:
+            with self.__lock:
+                self.__pending -= 1
+            self.storage.close()
@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+"""Deadlines, retries, a concurrency limit and a circuit breaker for
+calls to the upstream model"""
+import os
+import random
+import threading
+import time
+from llm.backends import Backend, UpstreamError
+
+# Failures worth another attempt
+RETRIABLE = (TimeoutError, ConnectionError, UpstreamError)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling upstream when it is known to be failing
+    or saturated; `retry_after` is a hint in seconds"""
+
+    def __init__(self, message, retry_after=1):
+        """Initialization"""
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops calling an upstream that keeps failing.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds. It then lets one trial
+    call through (half open): success closes it, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """Initialization"""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__trial = False
+        self.__lock = threading.Lock()
+        self.__stats = {'opened': 0, 'rejected': 0}
+
+    def before_call(self):
+        """Raises UpstreamUnavailable if the call may not go ahead"""
+        with self.__lock:
+            if self.__state == self.OPEN:
+                remaining = self.__opened_at + self.reset_timeout - \
+                    time.monotonic()
+                if remaining > 0:
+                    self.__stats['rejected'] += 1
+                    raise UpstreamUnavailable(
+                        "Roadmap generation is temporarily unavailable",
+                        retry_after=max(1, int(remaining + 0.999)))
+                self.__state = self.HALF_OPEN
+                self.__trial = False
+            if self.__state == self.HALF_OPEN:
+                if self.__trial:
+                    self.__stats['rejected'] += 1
+                    raise UpstreamUnavailable(
+                        "Roadmap generation is temporarily unavailable",
+                        retry_after=1)
+                self.__trial = True
+
+    def record_success(self):
+        """Notes a successful call"""
+        with self.__lock:
+            self.__state = self.CLOSED
+            self.__failures = 0
+            self.__trial = False
+
+    def record_failure(self):
+        """Notes a failed call"""
+        with self.__lock:
+            self.__failures += 1
+            if self.__state == self.HALF_OPEN or \
+                    self.__failures >= self.failure_threshold:
+                if self.__state != self.OPEN:
+                    self.__stats['opened'] += 1
+                self.__state = self.OPEN
+                self.__opened_at = time.monotonic()
+                self.__trial = False
+
+    def stats(self):
+        """Returns the state and counters of the breaker"""
+        with self.__lock:
+            return dict(self.__stats, state=self.__state,
+                        consecutive_failures=self.__failures)
+
+
+class RetryBudget:
+    """Caps retries to a fraction of the calls made, so retries cannot
+    multiply the load on an upstream that is already struggling.
+
+    Every call earns `ratio` of a retry; `min_per_second` retries are
+    always allowed so a quiet service can still retry. At most
+    `max_tokens` retries can be saved up.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=1.0, max_tokens=10):
+        """Initialization"""
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.__tokens = float(max_tokens)
+        self.__refilled_at = time.monotonic()
+        self.__lock = threading.Lock()
+        self.__stats = {'retries': 0, 'exhausted': 0}
+
+    def __refill(self):
+        """Adds the tokens earned with time; called with the lock held"""
+        now = time.monotonic()
+        self.__tokens = min(self.max_tokens, self.__tokens +
+                            (now - self.__refilled_at) * self.min_per_second)
+        self.__refilled_at = now
+
+    def deposit(self):
+        """Records a call"""
+        with self.__lock:
+            self.__refill()
+            self.__tokens = min(self.max_tokens, self.__tokens + self.ratio)
+
+    def withdraw(self):
+        """Takes a retry from the budget; returns False if none is left"""
+        with self.__lock:
+            self.__refill()
+            if self.__tokens < 1:
+                self.__stats['exhausted'] += 1
+                return False
+            self.__tokens -= 1
+            self.__stats['retries'] += 1
+            return True
+
+    def stats(self):
+        """Returns the retries left and counters"""
+        with self.__lock:
+            self.__refill()
+            return dict(self.__stats, tokens=round(self.__tokens, 2))
+
+
+class ResilientBackend(Backend):
+    """Wraps a backend with protection against a slow or failing
+    upstream:
+
+    - every call has a deadline of `timeout` seconds;
+    - failed calls are retried up to `max_attempts` times in all, with
+      jittered exponential backoff, while the retry budget allows;
+    - at most `max_concurrency` calls are outstanding; a call waits up
+      to `queue_timeout` seconds for a slot, then is rejected;
+    - a circuit breaker rejects calls while upstream keeps failing.
+
+    Rejections raise UpstreamUnavailable, which the app answers with a
+    503 and a Retry-After header.
+    """
+
+    def __init__(self, backend, timeout=60, max_attempts=3, backoff=0.5,
+                 max_concurrency=8, queue_timeout=5, budget=None,
+                 breaker=None):
+        """Initialization"""
+        self.backend = backend
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.__slots = threading.BoundedSemaphore(max_concurrency)
+        self.__lock = threading.Lock()
+        self.__stats = {'calls': 0, 'failures': 0, 'timeouts': 0,
+                        'saturated': 0, 'in_flight': 0}
+
+    @classmethod
+    def from_env(cls, backend):
+        """Wraps a backend with the settings in the environment:
+        RDMP_LLM_TIMEOUT, RDMP_LLM_MAX_ATTEMPTS, RDMP_LLM_RETRY_RATIO,
+        RDMP_LLM_MAX_CONCURRENCY, RDMP_LLM_QUEUE_TIMEOUT,
+        RDMP_LLM_BREAKER_THRESHOLD and RDMP_LLM_BREAKER_RESET"""
+        return cls(
+            backend,
+            timeout=float(os.getenv('RDMP_LLM_TIMEOUT', 60)),
+            max_attempts=int(os.getenv('RDMP_LLM_MAX_ATTEMPTS', 3)),
+            max_concurrency=int(os.getenv('RDMP_LLM_MAX_CONCURRENCY', 8)),
+            queue_timeout=float(os.getenv('RDMP_LLM_QUEUE_TIMEOUT', 5)),
+            budget=RetryBudget(
+                ratio=float(os.getenv('RDMP_LLM_RETRY_RATIO', 0.2))),
+            breaker=CircuitBreaker(
+                failure_threshold=int(
+                    os.getenv('RDMP_LLM_BREAKER_THRESHOLD', 5)),
+                reset_timeout=float(os.getenv('RDMP_LLM_BREAKER_RESET', 30)))
+        )
+
+    def __bump(self, name, n=1):
+        """Increments a counter"""
+        with self.__lock:
+            self.__stats[name] += n
+
+    def __acquire(self):
+        """Takes a concurrency slot or raises UpstreamUnavailable"""
+        if not self.__slots.acquire(timeout=self.queue_timeout):
+            self.__bump('saturated')
+            raise UpstreamUnavailable(
+                "Too many roadmaps are being generated", retry_after=1)
+        self.__bump('in_flight')
+
+    def __release(self):
+        """Gives a concurrency slot back"""
+        self.__bump('in_flight', -1)
+        self.__slots.release()
+
+    def __attempts(self, call):
+        """Runs call() with the breaker, retries and budget; returns its
+        result"""
+        self.budget.deposit()
+        attempt = 1
+        while True:
+            self.breaker.before_call()
+            self.__bump('calls')
+            try:
+                result = call()
+            except RETRIABLE as e:
+                self.breaker.record_failure()
+                self.__bump('failures')
+                if isinstance(e, TimeoutError):
+                    self.__bump('timeouts')
+                if attempt >= self.max_attempts or \
+                        not self.budget.withdraw():
+                    raise
+            except Exception:
+                # upstream answered, even if with an error
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            attempt += 1
+
+    def complete(self, messages, model, max_tokens, timeout=None):
+        """Returns the whole completion text"""
+        self.__acquire()
+        try:
+            return self.__attempts(lambda: self.backend.complete(
+                messages, model, max_tokens, timeout or self.timeout))
+        finally:
+            self.__release()
+
+    def stream(self, messages, model, max_tokens, timeout=None):
+        """Yields the completion text piece by piece and returns the
+        finish reason. Only getting the first piece is retried; the slot
+        is held until the stream ends"""
+        self.__acquire()
+        try:
+            def start():
+                stream = self.backend.stream(messages, model, max_tokens,
+                                             timeout or self.timeout)
+                return stream, next(stream, None)
+
+            stream, first = self.__attempts(start)
+            if first is not None:
+                yield first
+                return (yield from stream)
+        finally:
+            self.__release()
+
+    def stats(self):
+        """Returns the counters, breaker state and retry budget"""
+        with self.__lock:
+            stats = dict(self.__stats)
+        stats.update(max_concurrency=self.max_concurrency,
+                     breaker=self.breaker.stats(),
+                     retry_budget=self.budget.stats())
+        return stats
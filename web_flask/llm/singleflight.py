@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+"""Deduplication of identical concurrent calls"""
+import threading
+
+
+class CoalesceTimeout(Exception):
+    """Raised when a waiting caller gives up on the call it joined"""
+
+
+class _Call:
+    """One in-flight call and the callers waiting on it"""
+
+    def __init__(self):
+        """Initialization"""
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Lets only one call per key run at a time.
+
+    The first caller for a key runs the function; callers arriving with
+    the same key while it runs wait up to `timeout` seconds and share
+    its result, or its exception.
+    """
+
+    def __init__(self, timeout=None):
+        """Initialization; timeout None makes followers wait forever"""
+        self.timeout = timeout
+        self.__calls = {}
+        self.__lock = threading.Lock()
+        self.__stats = {'calls': 0, 'coalesced': 0, 'timeouts': 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Returns fn(*args, **kwargs), sharing the run with concurrent
+        callers using the same key"""
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.__calls[key] = _Call()
+                self.__stats['calls'] += 1
+            else:
+                self.__stats['coalesced'] += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                with self.__lock:
+                    self.__stats['timeouts'] += 1
+                raise CoalesceTimeout(
+                    f"Gave up after {self.timeout}s waiting for an "
+                    "identical request")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+            call.done.set()
+
+    def stats(self):
+        """Returns how many calls ran and how many were coalesced"""
+        with self.__lock:
+            return dict(self.__stats, in_flight=len(self.__calls))
@@ -1,5 +1,42 @@
 #!/usr/bin/python3
-"""This module instantiates an object of class based on the storage type"""
-from models.engine.db_storage import DBStorage
-storage = DBStorage()
-storage.reload()
+"""This module instantiates an object of class based on the storage type.
+
+`storage` is created lazily: the DBStorage behind it, and its database
+engine, only come into being on first use, so the models can be
+imported without a database. Nothing touches the schema on startup;
+storage.init_schema() creates the tables and applies migrations.
+"""
+import threading
+
+
+class LazyStorage:
+    """Stands in for the storage object, creating it on first use"""
+
+    def __init__(self):
+        """Initialization"""
+        self.__storage = None
+        self.__lock = threading.Lock()
+
+    def __get(self):
+        """Returns the storage object, creating it the first time"""
+        if self.__storage is None:
+            with self.__lock:
+                if self.__storage is None:
+                    from models.engine.db_storage import DBStorage
+                    storage = DBStorage()
+                    storage.reload()
+                    self.__storage = storage
+        return self.__storage
+
+    def close(self):
+        """Closes the calling thread's session; there is none to close
+        before the storage object exists, so this never creates it"""
+        if self.__storage is not None:
+            self.__storage.close()
+
+    def __getattr__(self, name):
+        """Forwards everything else to the storage object"""
+        return getattr(self.__get(), name)
+
+
+storage = LazyStorage()
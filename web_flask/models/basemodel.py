@@ -14,7 +14,8 @@ class BaseModel():
     """ """
     id = Column(String(60), nullable=False, primary_key=True)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow())
-    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow())
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow(),
+                        onupdate=datetime.now)
 
     def __init__(self, *args, **kwargs):
         """ """
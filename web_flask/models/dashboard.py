@@ -1,13 +1,22 @@
 #!/usr/bin/python3
 """ """
 from models.basemodel import BaseModel, Base
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 
 
 class Dashboard(BaseModel, Base):
-    """ """
+    """Counts of a user's roadmaps in each status, kept up to date by
+    models.engine.counters"""
     __tablename__ = "dashboard"
-    roadmap_id = Column(String(60), ForeignKey('roadmap.id'), nullable=False)
+    __table_args__ = (
+        Index('ix_dashboard_roadmap_id', 'roadmap_id'),
+        Index('ix_dashboard_user_id', 'user_id', unique=True),
+    )
+    # the counters are changed with UPDATE statements that bypass the
+    # session, so reads must not be served from the object cache
+    cached = False
+    roadmap_id = Column(String(60), ForeignKey('roadmap.id'), nullable=True)
+    user_id = Column(String(60), ForeignKey('users.id'), nullable=True)
     planning = Column(Integer, nullable=False, default=0)
     in_progress = Column(Integer, nullable=False, default=0)
     completed = Column(Integer, nullable=False, default=0)
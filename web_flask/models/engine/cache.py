@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+"""Key/value cache backends with TTL and LRU eviction"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class LRUCache:
+    """In-process cache holding at most `maxsize` entries.
+
+    Entries older than `ttl` seconds are treated as missing; when the
+    cache is full the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """Initialization"""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__data = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                        'expirations': 0, 'invalidations': 0}
+
+    def get(self, key, default=None):
+        """Returns the value stored under key, or default"""
+        with self.__lock:
+            entry = self.__data.get(key)
+            if entry is not None and self.ttl is not None and \
+                    entry[0] + self.ttl < time.monotonic():
+                del self.__data[key]
+                self.__stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.__stats['misses'] += 1
+                return default
+            self.__data.move_to_end(key)
+            self.__stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Stores value under key"""
+        with self.__lock:
+            self.__data[key] = (time.monotonic(), value)
+            self.__data.move_to_end(key)
+            while len(self.__data) > self.maxsize:
+                self.__data.popitem(last=False)
+                self.__stats['evictions'] += 1
+
+    def delete(self, key):
+        """Removes key from the cache"""
+        with self.__lock:
+            if self.__data.pop(key, None) is not None:
+                self.__stats['invalidations'] += 1
+
+    def clear(self):
+        """Removes every entry"""
+        with self.__lock:
+            self.__data.clear()
+
+    def stats(self):
+        """Returns the hit/miss/eviction counters and the current size"""
+        with self.__lock:
+            stats = dict(self.__stats, size=len(self.__data),
+                         maxsize=self.maxsize, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class SQLiteCache:
+    """Cache kept in a local SQLite file, shared by every process on the
+    host and surviving restarts.
+
+    Values are pickled. It has the same interface as LRUCache: the least
+    recently read entries are evicted once more than `maxsize` are stored.
+    """
+
+    def __init__(self, path, maxsize=1024, ttl=None):
+        """Initialization"""
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__lock = threading.Lock()
+        self.__stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                        'expirations': 0, 'invalidations': 0}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self.__connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                         "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                         "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed_at "
+                         "ON cache (accessed_at)")
+
+    @contextmanager
+    def __connect(self):
+        """Yields a connection inside a transaction; one connection per
+        call keeps the cache usable from any thread"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def __bump(self, name, n=1):
+        """Increments a counter"""
+        with self.__lock:
+            self.__stats[name] += n
+
+    def get(self, key, default=None):
+        """Returns the value stored under key, or default"""
+        now = time.time()
+        with self.__connect() as conn:
+            row = conn.execute("SELECT value, stored_at FROM cache "
+                               "WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and \
+                    row[1] + self.ttl < now:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.__bump('expirations')
+                row = None
+            if row is None:
+                self.__bump('misses')
+                return default
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?",
+                         (now, key))
+        self.__bump('hits')
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        """Stores value under key"""
+        now = time.time()
+        with self.__connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache "
+                         "(key, value, stored_at, accessed_at) "
+                         "VALUES (?, ?, ?, ?)",
+                         (key, pickle.dumps(value), now, now))
+            evicted = conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,)).rowcount
+        if evicted > 0:
+            self.__bump('evictions', evicted)
+
+    def delete(self, key):
+        """Removes key from the cache"""
+        with self.__connect() as conn:
+            deleted = conn.execute("DELETE FROM cache WHERE key = ?",
+                                   (key,)).rowcount
+        if deleted > 0:
+            self.__bump('invalidations', deleted)
+
+    def clear(self):
+        """Removes every entry"""
+        with self.__connect() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def stats(self):
+        """Returns the hit/miss/eviction counters and the current size"""
+        with self.__connect() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        with self.__lock:
+            stats = dict(self.__stats, size=size,
+                         maxsize=self.maxsize, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+def make_cache(backend, maxsize=1024, ttl=None, path=None):
+    """Returns a cache for a backend name: 'memory' or 'sqlite' (stored
+    at `path`). Returns None for 'none', meaning caching is off"""
+    backend = (backend or 'none').lower()
+    if backend == 'memory':
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path, maxsize=maxsize, ttl=ttl)
+    if backend == 'none':
+        return None
+    raise ValueError(f"Unknown cache backend: {backend}")
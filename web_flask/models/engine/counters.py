@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""Per-user counts of roadmaps in each status, kept in the dashboard table.
+
+Counters are changed in the same transaction as the roadmaps they count:
+ORM flushes are followed by an after_flush hook (see track()), and the
+bulk statements of DBStorage call apply() themselves. Deltas are dicts
+{user_id: [planning, in_progress, completed]}, indexed by status code.
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, func, inspect, insert, select, update, delete
+from models.dashboard import Dashboard
+from models.roadmap import Roadmap
+
+
+def deltas():
+    """Returns an empty set of deltas"""
+    return defaultdict(lambda: [0] * len(Roadmap.STATUSES))
+
+
+def count_rows(conn, *criteria):
+    """Returns the deltas that would remove the roadmaps matching
+    criteria from the counters, with one GROUP BY. The rows are locked
+    until the end of the transaction, so a concurrent change cannot
+    count them twice"""
+    changes = deltas()
+    stmt = select(Roadmap.user_id, Roadmap.status, func.count()) \
+        .where(*criteria) \
+        .group_by(Roadmap.user_id, Roadmap.status) \
+        .with_for_update()
+    for user_id, status, n in conn.execute(stmt):
+        changes[user_id][status] -= n
+    return changes
+
+
+def apply(conn, changes):
+    """Adds deltas to the counters of their users. A user who has no
+    counters yet gets them counted from the roadmap table, which must
+    already include the changes; see upsert().
+
+    Whether the counters exist is checked with a plain SELECT, which
+    takes no locks: an UPDATE of a missing row would take a gap lock on
+    ix_dashboard_user_id under InnoDB, and two transactions inserting
+    the same user's counters after one would deadlock"""
+    now = datetime.now()
+    for user_id, counts in changes.items():
+        values = {name: getattr(Dashboard, name) + n
+                  for name, n in zip(Roadmap.STATUSES, counts) if n}
+        if not values:
+            continue
+        exists = conn.execute(
+            select(Dashboard.id).where(Dashboard.user_id == user_id)
+        ).first()
+        updated = exists and conn.execute(
+            update(Dashboard)
+            .where(Dashboard.user_id == user_id)
+            .values(updated_at=now, **values)
+        ).rowcount
+        if not updated:
+            upsert(conn, user_id, values, now)
+
+
+def upsert(conn, user_id, values, now):
+    """Creates the counters of a user from the roadmap table, or adds
+    `values` to them if a concurrent transaction created them first.
+
+    The row it counted in is not visible to that transaction, and its
+    rows are not visible here, so the two never count a roadmap twice.
+    Dialects without an upsert fall back to rebuild()"""
+    if conn.dialect.name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+    elif conn.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        rebuild(conn, [user_id])
+        return
+
+    counts = [0] * len(Roadmap.STATUSES)
+    stmt = select(Roadmap.status, func.count()) \
+        .where(Roadmap.user_id == user_id) \
+        .group_by(Roadmap.status)
+    for status, n in conn.execute(stmt):
+        counts[status] += n
+    stmt = dialect_insert(Dashboard).values(
+        id=str(uuid.uuid4()), user_id=user_id, created_at=now,
+        updated_at=now, **dict(zip(Roadmap.STATUSES, counts)))
+    if conn.dialect.name == 'mysql':
+        stmt = stmt.on_duplicate_key_update(updated_at=now, **values)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=['user_id'],
+                                          set_=dict(updated_at=now, **values))
+    conn.execute(stmt)
+
+
+def rebuild(conn, user_ids=None):
+    """Recounts the counters of some users (all of them by default) from
+    the roadmap table with a single GROUP BY. Returns the number of
+    users whose counters were written"""
+    stmt = select(Roadmap.user_id, Roadmap.status, func.count()) \
+        .group_by(Roadmap.user_id, Roadmap.status)
+    stale = delete(Dashboard).where(Dashboard.user_id.isnot(None))
+    counts = deltas()
+    if user_ids is not None:
+        stmt = stmt.where(Roadmap.user_id.in_(user_ids))
+        stale = stale.where(Dashboard.user_id.in_(user_ids))
+        for user_id in user_ids:
+            counts[user_id] = [0] * len(Roadmap.STATUSES)
+    for user_id, status, n in conn.execute(stmt):
+        counts[user_id][status] += n
+
+    conn.execute(stale)
+    now = datetime.now()
+    rows = [dict(zip(Roadmap.STATUSES, values), id=str(uuid.uuid4()),
+                 user_id=user_id, created_at=now, updated_at=now)
+            for user_id, values in counts.items()]
+    if rows:
+        conn.execute(insert(Dashboard), rows)
+    return len(rows)
+
+
+def _previous(obj, name):
+    """Returns the value an attribute had before the pending flush"""
+    history = inspect(obj).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(obj, name)
+
+
+def track(session_factory):
+    """Keeps the counters in step with the roadmaps that sessions made
+    by session_factory create, delete or move through the ORM"""
+    @event.listens_for(session_factory, 'after_flush')
+    def after_flush(session, context):
+        changes = deltas()
+        for obj in session.new:
+            if isinstance(obj, Roadmap):
+                status = Roadmap.PLANNING if obj.status is None \
+                    else obj.status
+                changes[obj.user_id][status] += 1
+        for obj in session.deleted:
+            if isinstance(obj, Roadmap):
+                changes[_previous(obj, 'user_id')][
+                    _previous(obj, 'status')] -= 1
+        for obj in session.dirty:
+            if isinstance(obj, Roadmap):
+                old = _previous(obj, 'user_id'), _previous(obj, 'status')
+                new = obj.user_id, obj.status
+                if old != new:
+                    changes[old[0]][old[1]] -= 1
+                    changes[new[0]][new[1]] += 1
+        if changes:
+            apply(session.connection(), changes)
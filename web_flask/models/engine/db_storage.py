@@ -1,6 +1,13 @@
 #/usr/bin/python3
 """New storage"""
 import os
+import copy
+import json
+import uuid
+import base64
+import threading
+from itertools import islice
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from models.basemodel import Base
 from models.reviews import Review
@@ -10,8 +17,19 @@ from models.roadmap import Roadmap
 from models.topics import Topic
 from models.resources import Resources
 from models.objectives import Objectives
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+from models.job import Job
+from sqlalchemy import create_engine, event, insert, select, update, delete
+from sqlalchemy import and_, or_
+from sqlalchemy import func, literal, union_all, inspect, text
+from sqlalchemy import Text, JSON, LargeBinary, DateTime
+from sqlalchemy.orm import sessionmaker, scoped_session, selectinload
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.ext.hybrid import HybridExtensionType
+from models.engine.cache import make_cache
+from models.engine import counters
 
 
 class DBStorage:
@@ -22,52 +40,369 @@ class DBStorage:
     def __init__(self):
         """Initialization"""
         load_dotenv()
+        # kept to be reported by pool_stats(); not every pool type can
+        # tell them
+        self.__pool_settings = dict(
+            pool_size=int(os.getenv('RDMP_POOL_SIZE', 5)),
+            max_overflow=int(os.getenv('RDMP_POOL_MAX_OVERFLOW', 10)),
+            pool_recycle=int(os.getenv('RDMP_POOL_RECYCLE', 3600)),
+            pool_timeout=float(os.getenv('RDMP_POOL_TIMEOUT', 30)),
+            pool_pre_ping=os.getenv('RDMP_POOL_PRE_PING', 'true'
+                                    ).lower() in ('1', 'true', 'yes')
+        )
         self.__engine = create_engine(
                                     'mysql+mysqldb://{}:{}@{}:3306/{}'.
                                     format(
                                             os.getenv('RDMP_MYSQL_USER'),
                                             os.getenv('RDMP_MYSQL_PWD'),
                                             os.getenv('RDMP_MYSQL_HOST'),
-                                            os.getenv('RDMP_MYSQL_DB'),
-                                            # pool_pre_ping=True
-                                            )
+                                            os.getenv('RDMP_MYSQL_DB')
+                                            ),
+                                    **self.__pool_settings
                                     )
-        if os.getenv('RDMP_ENV') == 'test':
-            Base.metadata.drop_all(self.__engine)
+        self.__watch_pool()
+        self.__cache = make_cache(
+            os.getenv('RDMP_OBJECT_CACHE', 'memory'),
+            maxsize=int(os.getenv('RDMP_OBJECT_CACHE_SIZE', 1024)),
+            ttl=float(os.getenv('RDMP_OBJECT_CACHE_TTL', 300)),
+            path=os.getenv('RDMP_OBJECT_CACHE_PATH', 'object_cache.sqlite3')
+        )
+        # invalidation counters, one per bucket of keys; see show()
+        self.__generations = [0] * 4096
+        self.__generations_lock = threading.Lock()
+
+    def __watch_pool(self):
+        """Counts connection pool events so the pool can be sized"""
+        self.__pool_lock = threading.Lock()
+        self.__pool_events = {'connects': 0, 'checkouts': 0, 'checkins': 0,
+                              'invalidations': 0, 'peak_checked_out': 0}
+        pool = self.__engine.pool
+
+        def bump(name):
+            with self.__pool_lock:
+                self.__pool_events[name] += 1
+
+        def on_checkout(dbapi_conn, record, proxy):
+            bump('checkouts')
+            if not isinstance(pool, QueuePool):
+                return
+            with self.__pool_lock:
+                self.__pool_events['peak_checked_out'] = max(
+                    self.__pool_events['peak_checked_out'],
+                    pool.checkedout())
+
+        event.listen(pool, 'connect', lambda *args: bump('connects'))
+        event.listen(pool, 'checkout', on_checkout)
+        event.listen(pool, 'checkin', lambda *args: bump('checkins'))
+        event.listen(pool, 'invalidate', lambda *args: bump('invalidations'))
 
-            self.__session = scoped_session(sessionmaker(bind=self.__engine,
-                                            expire_on_commit=False))
+    def pool_stats(self):
+        """Returns the connection pool settings, its current usage and
+        the event counters collected since start-up. Usage is only
+        reported by queue pools; other pools (NullPool, StaticPool)
+        keep no connections to count"""
+        pool = self.__engine.pool
+        settings = self.__pool_settings
+        with self.__pool_lock:
+            stats = dict(self.__pool_events)
+        stats.update(
+            type=type(pool).__name__,
+            size=settings['pool_size'],
+            max_overflow=settings['max_overflow'],
+            timeout=settings['pool_timeout'],
+            recycle=settings['pool_recycle'],
+            pre_ping=settings['pool_pre_ping']
+        )
+        if isinstance(pool, QueuePool):
+            stats.update(
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow()
+            )
+        return stats
 
-    def all(self, cls=None):
+    def all(self, cls=None, limit=None, offset=None, where=None,
+            lazy=False, batch_size=1000):
         """"Query on the current database session all
-        objects depending on class name"""
-        objects = {}
+        objects depending on class name.
+
+        `where` is a dict of column values the objects must match (with
+        no cls, only the classes that have all of those columns are
+        queried), and `limit`/`offset` page through them in creation
+        order; without them rows come in no particular order, so a full
+        table is never sorted before the first one is returned. offset
+        needs a cls, as skipping rows across classes would read them all.
+        Returns {"<class>.<id>": obj}, or with lazy=True a generator of
+        the objects read from a server-side cursor batch_size at a time,
+        so memory does not grow with the size of the tables."""
+        if offset and not cls:
+            raise ValueError("offset needs a class")
         if cls:
             if isinstance(cls, str):
                 cls = eval(cls)
-            query = self.__session.query(cls)
-            for obj in query:
-                key = f"{type(obj).__name__}.{obj.id}"
-                objects[key] = obj
+            classes = [cls]
         else:
-            classes = [Review, User, Dashboard, Roadmap, Topic, Resources, Objectives]
+            classes = [element for element in
+                       [Review, User, Dashboard, Roadmap, Topic, Resources,
+                        Objectives, Job]
+                       if all(name in element.__table__.columns
+                              for name in where or ())]
+        paged = limit is not None or offset
+
+        def stream():
             for element in classes:
-                query = self.__session.query(element)
-                for obj in query:
-                    key = f"{type(obj).__name__}.{obj.id}"
-                    objects[key] = obj
+                stmt = select(element).filter_by(**(where or {}))
+                if paged:
+                    stmt = stmt.order_by(element.created_at, element.id)
+                if cls:
+                    stmt = stmt.offset(offset).limit(limit)
+                yield from self.__session.scalars(
+                    stmt, execution_options={'yield_per': batch_size})
+
+        objects = stream()
+        if not cls and limit is not None:
+            objects = islice(objects, limit)
+        if lazy:
+            return objects
+        return {f"{type(obj).__name__}.{obj.id}": obj for obj in objects}
 
-        return objects
-    
     def show(self, cls, id):
-        """Shows a specific object"""
+        """Shows a specific object.
+
+        Reads go through the object cache: on a hit the object is
+        rebuilt from the cached column values and attached to the
+        session without touching the database. Classes whose rows other
+        processes change all the time (cached = False, e.g. Job) are
+        always read from the database.
+
+        A value read from the database is only cached if its key was not
+        invalidated while the query ran, so a read racing with a write
+        cannot put the old values back after the write's eviction.
+        """
         if cls and id:
             if isinstance(cls, str) and isinstance(id, str):
                 cls = eval(cls)
                 # id = eval(id)
+            obj = self.__session.identity_map.get(identity_key(cls, id))
+            if obj is not None:
+                return obj
+            if self.__cache is None or not getattr(cls, 'cached', True):
+                return self.__session.query(cls).filter(cls.id == id).first()
+            key = f"{cls.__name__}.{id}"
+            values = self.__cache.get(key)
+            if values is not None:
+                return self.__from_snapshot(cls, values)
+            bucket = hash(key) % len(self.__generations)
+            generation = self.__generations[bucket]
             query = self.__session.query(cls).filter(cls.id == id).first()
+            if query is not None:
+                values = self.__snapshot(query)
+                with self.__generations_lock:
+                    if self.__generations[bucket] == generation:
+                        self.__cache.set(key, values)
             return query
 
+    def get(self, cls, id):
+        """Returns the object of a class with the given primary key, or
+        None. The session's identity map is checked before the database"""
+        if not cls or not id:
+            return None
+        if isinstance(cls, str):
+            cls = eval(cls)
+        return self.__session.get(cls, id)
+
+    @staticmethod
+    def __snapshot(obj):
+        """Returns the column values of an object"""
+        return {attr.key: copy.deepcopy(getattr(obj, attr.key))
+                for attr in inspect(obj).mapper.column_attrs}
+
+    def __from_snapshot(self, cls, values):
+        """Rebuilds a persistent object from its column values"""
+        obj = inspect(cls).class_manager.new_instance()
+        for name, value in values.items():
+            set_committed_value(obj, name, copy.deepcopy(value))
+        make_transient_to_detached(obj)
+        self.__session.add(obj)
+        return obj
+
+    def evict(self, obj=None, key=None):
+        """Drops an object, given itself or its "Class.id" key, from the
+        object cache"""
+        if self.__cache is None:
+            return
+        if obj is not None:
+            key = f"{type(obj).__name__}.{obj.id}"
+        self.__invalidate(key)
+        self.__session.info.setdefault('evict', set()).add(key)
+
+    def __invalidate(self, key):
+        """Deletes a key from the object cache and marks it as changed
+        for reads in flight"""
+        with self.__generations_lock:
+            self.__generations[hash(key) % len(self.__generations)] += 1
+            self.__cache.delete(key)
+
+    def cache_stats(self):
+        """Returns the object cache's hit/miss/eviction counters"""
+        if self.__cache is None:
+            return {'enabled': False}
+        return dict(self.__cache.stats(), enabled=True,
+                    backend=type(self.__cache).__name__)
+
+    def summaries(self, cls, fields=None, lazy=False, batch_size=1000):
+        """Returns lightweight rows for listing objects of a class.
+
+        Only the requested columns are selected, and the result is a
+        list of read-only named tuples rather than ORM objects, so
+        nothing is added to the session's identity map. By default every
+        column except the large Text/JSON/binary ones is returned. With
+        lazy=True the rows are streamed batch_size at a time instead.
+        """
+        if isinstance(cls, str):
+            cls = eval(cls)
+        result = self.__session.execute(
+            select(*self.__columns(cls, fields)),
+            execution_options={'yield_per': batch_size} if lazy else {})
+        return result if lazy else result.all()
+
+    @staticmethod
+    def __columns(cls, fields=None):
+        """Maps field names of a class to its columns, labelled with the
+        field names so hybrid properties such as Roadmap.planning can be
+        read off the rows like columns"""
+        if not fields:
+            columns = [column for column in cls.__table__.columns
+                       if not isinstance(column.type,
+                                         (Text, JSON, LargeBinary))]
+            return columns + [
+                getattr(cls, name).label(name)
+                for name, attr in inspect(cls).all_orm_descriptors.items()
+                if attr.extension_type is HybridExtensionType.HYBRID_PROPERTY]
+        try:
+            return [getattr(cls, field).label(field) for field in fields]
+        except AttributeError as e:
+            raise ValueError(f"Unknown field for {cls.__name__}: {e}")
+
+    def iter_all(self, cls, batch_size=1000):
+        """Yields every row of a class as a dict of its column values.
+
+        Rows are read from a server-side cursor batch_size at a time and
+        are never turned into ORM objects, so memory stays flat however
+        large the table is.
+        """
+        if isinstance(cls, str):
+            cls = eval(cls)
+        result = self.__session.execute(
+            select(cls.__table__),
+            execution_options={'yield_per': batch_size})
+        for row in result.mappings():
+            yield dict(row)
+
+    def bulk_insert(self, cls, rows, batch_size=1000, commit=True):
+        """Inserts an iterable of column dicts, as produced by iter_all,
+        batch_size rows per statement in a single transaction. DateTime
+        values may be ISO strings. Returns the number of rows inserted;
+        on failure nothing is written. With commit=False the rows join
+        the current transaction, for the caller to save() or rollback()"""
+        if isinstance(cls, str):
+            cls = eval(cls)
+        table = cls.__table__
+        dates = [column.name for column in table.columns
+                 if isinstance(column.type, DateTime)]
+        count = 0
+        batch = []
+        try:
+            for row in rows:
+                for name in dates:
+                    if isinstance(row.get(name), str):
+                        row[name] = datetime.fromisoformat(row[name])
+                batch.append(row)
+                if len(batch) == batch_size:
+                    self.__session.execute(insert(table), batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self.__session.execute(insert(table), batch)
+                count += len(batch)
+            if commit:
+                self.__session.commit()
+        except Exception:
+            self.__session.rollback()
+            raise
+        return count
+
+    def paginate(self, cls, after=None, before=None, limit=30, fields=None,
+                 **filters):
+        """Returns one page of objects, newest first.
+
+        Pages are keyed on (created_at, id) rather than OFFSET, so every
+        page is a bounded index range scan however deep it is. Pass the
+        `next` cursor of a page as `after` to get the following page, or
+        its `prev` cursor as `before` to go back. Returns a tuple
+        (objects, prev_cursor, next_cursor); a cursor is None when there
+        is no page in that direction. Raises ValueError on a bad cursor.
+
+        With `fields`, the page holds summary rows with only those
+        columns (see summaries()); `id` and `created_at` are always added.
+        Other keyword arguments are column values the objects must match,
+        e.g. user_id=..., status=Roadmap.IN_PROGRESS, which the
+        (user_id, status, created_at) index serves as one range scan.
+        """
+        if isinstance(cls, str):
+            cls = eval(cls)
+        if fields:
+            fields = ['id', 'created_at'] + \
+                [f for f in fields if f not in ('id', 'created_at')]
+            query = self.__session.query(*self.__columns(cls, fields))
+        else:
+            query = self.__session.query(cls)
+        query = query.filter_by(**filters)
+        if before:
+            created_at, id = self.__decode_cursor(before)
+            query = query.filter(or_(
+                cls.created_at > created_at,
+                and_(cls.created_at == created_at, cls.id > id)
+            )).order_by(cls.created_at.asc(), cls.id.asc())
+        else:
+            if after:
+                created_at, id = self.__decode_cursor(after)
+                query = query.filter(or_(
+                    cls.created_at < created_at,
+                    and_(cls.created_at == created_at, cls.id < id)
+                ))
+            query = query.order_by(cls.created_at.desc(), cls.id.desc())
+
+        objects = query.limit(limit + 1).all()
+        more = len(objects) > limit
+        objects = objects[:limit]
+        if before:
+            objects.reverse()
+
+        if not objects:
+            return objects, None, None
+        first = self.__encode_cursor(objects[0])
+        last = self.__encode_cursor(objects[-1])
+        if before:
+            return objects, first if more else None, last
+        return objects, first if after else None, last if more else None
+
+    @staticmethod
+    def __encode_cursor(obj):
+        """Encodes the (created_at, id) key of an object as a cursor"""
+        key = f"{obj.created_at.isoformat()}|{obj.id}"
+        return base64.urlsafe_b64encode(key.encode()).decode()
+
+    @staticmethod
+    def __decode_cursor(cursor):
+        """Decodes a cursor back into a (created_at, id) key"""
+        try:
+            key = base64.urlsafe_b64decode(cursor.encode()).decode()
+            created_at, id = key.split('|', 1)
+            return datetime.fromisoformat(created_at), id
+        except (ValueError, UnicodeError):
+            raise ValueError(f"Invalid page cursor: {cursor}")
+
     def fetch(self, cls_name, ref_id):
         """ Fetches the children of a specific parent """
         objects = {}
@@ -103,40 +438,469 @@ class DBStorage:
 
         return objects
 
-    def count(self, cls):
-        """Counts the number of a certain class in the storage"""
-        objects = {}
-        if cls:
-            if isinstance(cls, str):
-                cls = eval(cls)
-            query = self.__session.query(cls)
+    def fetch_many(self, cls_name, ref_ids, chunk_size=500):
+        """Fetches the children of many parents at once.
+
+        Returns {parent_id: [children]} with an entry (possibly empty) for
+        every id in ref_ids, children ordered by position where the class
+        has one. The ids are sent chunk_size at a time, one IN query per
+        chunk, so a long id list never becomes one huge statement.
+        """
+        if isinstance(cls_name, str):
+            cls_name = eval(cls_name)
+        search = {
+            "Topic": "roadmap_id",
+            "Dashboard": "roadmap_id",
+            "Roadmap": "user_id",
+            "Review": "user_id",
+            "Objectives": "topic_id",
+            "Resources": "topic_id"
+        }.get(cls_name.__name__)
+        if search is None:
+            raise ValueError(f"Class {cls_name.__name__} has no parent")
+
+        column = getattr(cls_name, search)
+        order = [column]
+        if hasattr(cls_name, 'position'):
+            order.append(cls_name.position)
+        order += [cls_name.created_at, cls_name.id]
+
+        ref_ids = list(dict.fromkeys(ref_ids))
+        children = {ref_id: [] for ref_id in ref_ids}
+        for i in range(0, len(ref_ids), chunk_size):
+            query = self.__session.query(cls_name).filter(
+                column.in_(ref_ids[i:i + chunk_size])).order_by(*order)
             for obj in query:
-                key = f"{type(obj).__name__}.{obj.id}"
-                objects[key] = obj
-        return len(objects)
+                children[getattr(obj, search)].append(obj)
+        return children
+
+    def load_roadmap_graph(self, roadmap_id):
+        """Loads a roadmap together with its topics (ordered by position)
+        and all of their objectives and resources.
+
+        The whole tree is pulled in four queries no matter how many
+        topics the roadmap has, instead of one query per topic.
+        """
+        if not roadmap_id:
+            return None
+        return self.__session.query(Roadmap).options(
+            selectinload(Roadmap.topic).selectinload(Topic.objectives),
+            selectinload(Roadmap.topic).selectinload(Topic.resources)
+        ).filter(Roadmap.id == roadmap_id).first()
+
+    def roadmap_version(self, roadmap_id):
+        """Returns (newest updated_at, number of rows) over a roadmap and
+        its topics, objectives and resources, or None if there is no such
+        roadmap. One indexed query; the pair changes whenever anything in
+        the tree is edited, added or removed."""
+        topic_ids = select(Topic.id).where(Topic.roadmap_id == roadmap_id)
+        tree = union_all(
+            select(Roadmap.updated_at).where(Roadmap.id == roadmap_id),
+            select(Topic.updated_at).where(Topic.roadmap_id == roadmap_id),
+            select(Objectives.updated_at)
+            .where(Objectives.topic_id.in_(topic_ids)),
+            select(Resources.updated_at)
+            .where(Resources.topic_id.in_(topic_ids))
+        ).subquery()
+        updated_at, rows = self.__session.execute(
+            select(func.max(tree.c.updated_at), func.count())).one()
+        if not rows:
+            return None
+        return updated_at, rows
+
+    def bulk_ingest_roadmap(self, payload, user_id):
+        """Validates a generated roadmap and writes the whole tree
+        (roadmap, topics, objectives, resources) in one transaction.
+
+        `payload` is the JSON produced by the model, either as a string
+        or already decoded: {"Roadmap": {"Title": ..., "Topics": [...]}}.
+        Returns the ids of the roadmaps written. Raises ValueError if the
+        payload is malformed; on any failure nothing is written.
+        """
+        roadmaps = self.validate_roadmap_payload(payload)
+        now = datetime.now()
+        ids = []
+        rows = {Roadmap: [], Topic: [], Objectives: [], Resources: []}
+
+        def row(**kwargs):
+            kwargs.update(id=str(uuid.uuid4()), created_at=now, updated_at=now)
+            return kwargs
+
+        for data in roadmaps:
+            roadmap = row(user_id=user_id,
+                          title=data['Title'],
+                          introduction=data['Introduction'],
+                          AdditionalInfo=data.get('AdditionalInfo'),
+                          status=Roadmap.PLANNING)
+            rows[Roadmap].append(roadmap)
+            ids.append(roadmap['id'])
+            for position, topic_data in enumerate(data['Topics'], 1):
+                topic = row(roadmap_id=roadmap['id'],
+                            position=position,
+                            name=topic_data['TopicName'],
+                            description=topic_data['Descriptions'],
+                            milestones=topic_data['Milestones'])
+                rows[Topic].append(topic)
+                for name in topic_data['LearningObjectives']:
+                    rows[Objectives].append(row(name=name,
+                                                topic_id=topic['id']))
+                for link in topic_data['Resources']:
+                    rows[Resources].append(row(link=link,
+                                               topic_id=topic['id']))
+
+        changes = counters.deltas()
+        changes[user_id][Roadmap.PLANNING] += len(ids)
+        try:
+            for cls, values in rows.items():
+                if values:
+                    self.__session.execute(insert(cls), values)
+            counters.apply(self.__session.connection(), changes)
+            self.__session.commit()
+        except Exception:
+            self.__session.rollback()
+            raise
+        return ids
+
+    @staticmethod
+    def validate_roadmap_payload(payload):
+        """Checks the shape of a generated roadmap and returns the list
+        of roadmap dicts it contains. Raises ValueError if it is not a
+        roadmap bulk_ingest_roadmap() can write"""
+        if isinstance(payload, (str, bytes)):
+            try:
+                payload = json.loads(payload)
+            except ValueError as e:
+                raise ValueError(f"Roadmap is not valid JSON: {e}")
+        if not isinstance(payload, dict) or not payload:
+            raise ValueError("Roadmap must be a JSON object")
+        roadmaps = [payload] if 'Title' in payload else list(payload.values())
+
+        for data in roadmaps:
+            if not isinstance(data, dict):
+                raise ValueError("Roadmap must be a JSON object")
+            for key in ('Title', 'Introduction'):
+                if not isinstance(data.get(key), str) or not data[key]:
+                    raise ValueError(f"Roadmap is missing '{key}'")
+            topics = data.get('Topics')
+            if not isinstance(topics, list) or not topics:
+                raise ValueError("Roadmap has no 'Topics'")
+            for topic in topics:
+                if not isinstance(topic, dict):
+                    raise ValueError("Topic must be a JSON object")
+                for key in ('TopicName', 'Descriptions', 'Milestones'):
+                    if not isinstance(topic.get(key), str):
+                        raise ValueError(f"Topic is missing '{key}'")
+                for key in ('LearningObjectives', 'Resources'):
+                    values = topic.get(key)
+                    if not isinstance(values, list) or \
+                            not all(isinstance(v, str) for v in values):
+                        raise ValueError(f"Topic '{key}' must be a list "
+                                         "of strings")
+        return roadmaps
+
+    def count(self, cls, **filters):
+        """Counts the objects of a class, optionally only those whose
+        columns equal the given values, with a single SELECT COUNT(*)"""
+        if not cls:
+            return 0
+        if isinstance(cls, str):
+            cls = eval(cls)
+        stmt = select(func.count()).select_from(cls).filter_by(**filters)
+        return self.__session.execute(stmt).scalar()
+
+    def count_by(self, cls, group_field, **filters):
+        """Counts the objects of a class per distinct value of a column,
+        e.g. count_by("Topic", "roadmap_id"). Returns {value: count}"""
+        if isinstance(cls, str):
+            cls = eval(cls)
+        column = getattr(cls, group_field)
+        stmt = select(column, func.count()).filter_by(**filters) \
+            .group_by(column)
+        return dict(self.__session.execute(stmt).all())
+
+    def counts(self, classes=None):
+        """Counts the objects of several classes (all of them by default)
+        in one statement. Returns {class name: count}"""
+        if classes is None:
+            classes = [Review, User, Dashboard, Roadmap, Topic, Resources,
+                       Objectives, Job]
+        classes = [eval(cls) if isinstance(cls, str) else cls
+                   for cls in classes]
+        stmt = union_all(*[
+            select(literal(cls.__name__).label('cls'), func.count())
+            .select_from(cls) for cls in classes
+        ])
+        return dict(self.__session.execute(stmt).all())
+
+    def set_roadmap_status(self, roadmap_id, status):
+        """Moves a roadmap to a status (planning, in_progress or
+        completed) with a single UPDATE, without loading it. Returns the
+        number of roadmaps updated: 0 if there is no such roadmap"""
+        return self.set_roadmaps_status([roadmap_id], status)
 
+    def set_roadmaps_status(self, roadmap_ids, status, chunk_size=500):
+        """Moves many roadmaps to a status, one UPDATE per chunk_size
+        ids, in one transaction together with their owners' dashboard
+        counters. Returns the number of roadmaps updated. Raises
+        ValueError for an unknown status"""
+        if status not in Roadmap.STATUSES:
+            raise ValueError(f"Unknown roadmap status: {status}")
+        code = Roadmap.STATUSES.index(status)
+        roadmap_ids = list(dict.fromkeys(roadmap_ids))
+        updated = 0
+        try:
+            conn = self.__session.connection()
+            for i in range(0, len(roadmap_ids), chunk_size):
+                chunk = roadmap_ids[i:i + chunk_size]
+                changes = counters.count_rows(
+                    conn, Roadmap.id.in_(chunk), Roadmap.status != code)
+                updated += self.__session.execute(
+                    update(Roadmap)
+                    .where(Roadmap.id.in_(chunk))
+                    .values(status=code, updated_at=datetime.now())
+                ).rowcount
+                for counts in changes.values():
+                    counts[code] -= sum(counts)
+                counters.apply(conn, changes)
+                for roadmap_id in chunk:
+                    self.evict(key=f"Roadmap.{roadmap_id}")
+            self.save()
+        except Exception:
+            self.rollback()
+            raise
+        return updated
+
+    def dashboard_counts(self, user_id):
+        """Returns {status: number of roadmaps} for a user, read from the
+        user's dashboard counters in one indexed lookup"""
+        row = self.__session.execute(
+            select(*[getattr(Dashboard, name) for name in Roadmap.STATUSES])
+            .where(Dashboard.user_id == user_id)).first()
+        return dict(zip(Roadmap.STATUSES,
+                        row or [0] * len(Roadmap.STATUSES)))
+
+    def recount_dashboards(self, user_ids=None):
+        """Rebuilds the dashboard counters of some users (all of them by
+        default) from the roadmap table with a single GROUP BY. Returns
+        the number of users recounted"""
+        try:
+            recounted = counters.rebuild(self.__session.connection(),
+                                         user_ids)
+            self.save()
+        except Exception:
+            self.rollback()
+            raise
+        return recounted
+
+    def claim_job(self, job_id):
+        """Marks a queued job as running; returns False if it was not
+        queued any more, e.g. another worker claimed it first"""
+        result = self.__session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == Job.QUEUED)
+            .values(status=Job.RUNNING, updated_at=datetime.now())
+        )
+        self.evict(key=f"Job.{job_id}")
+        self.save()
+        return result.rowcount == 1
+
+    def requeue_stale_jobs(self, stale_after):
+        """Puts jobs left running for more than `stale_after` seconds
+        back in the queue, and returns the ids of all queued jobs"""
+        cutoff = datetime.now() - timedelta(seconds=stale_after)
+        self.__session.execute(
+            update(Job)
+            .where(Job.status == Job.RUNNING, Job.updated_at < cutoff)
+            .values(status=Job.QUEUED, progress=0)
+        )
+        self.__session.commit()
+        job_ids = self.__session.execute(
+            select(Job.id).where(Job.status == Job.QUEUED)
+            .order_by(Job.created_at)
+        ).scalars().all()
+        for job_id in job_ids:
+            self.evict(key=f"Job.{job_id}")
+        self.__session.info.pop('evict', None)
+        return job_ids
 
     def new(self, obj):
         """Creates a new object"""
         self.__session.add(obj)
+        self.evict(obj)
 
     def save(self):
         """Saves an object"""
+        for obj in list(self.__session.dirty) + list(self.__session.deleted):
+            self.evict(obj)
         self.__session.commit()
+        # evict again, in case another thread cached the old values
+        # between the change and the commit
+        for key in self.__session.info.pop('evict', ()):
+            self.__invalidate(key)
+
+    def rollback(self):
+        """Discards the pending changes of the current session"""
+        self.__session.rollback()
+        self.__session.info.pop('evict', None)
 
     def delete(self, obj=None):
-        """Deletes an object"""
+        """Deletes an object, and evicts it and every object its
+        relationships cascade the delete to from the object cache"""
         if obj is not None:
+            state = inspect(obj)
+            for related, *_ in state.mapper.cascade_iterator('delete', state):
+                self.evict(related)
+            self.evict(obj)
             self.__session.delete(obj)
 
+    def delete_by_id(self, cls, id, chunk_size=500):
+        """Deletes an object by primary key without loading it, along
+        with everything its relationships cascade the delete to, and
+        evicts them all from the object cache.
+
+        Each class in the tree costs one SELECT of ids and one DELETE,
+        children first; a childless object is a single DELETE. Returns
+        True if the object existed. Deleted roadmaps are taken off their
+        owners' dashboard counters. Like delete(), nothing is committed
+        until save().
+        """
+        if isinstance(cls, str):
+            cls = eval(cls)
+        doomed = []
+
+        def collect(cls, ids):
+            doomed.append((cls, ids))
+            for rel in inspect(cls).relationships:
+                if not rel.cascade.delete:
+                    continue
+                child = rel.mapper.class_
+                ((parent_column, child_column),) = rel.local_remote_pairs
+                child_ids = []
+                for i in range(0, len(ids), chunk_size):
+                    child_ids += self.__session.scalars(
+                        select(child.id).where(
+                            child_column.in_(ids[i:i + chunk_size]))).all()
+                if child_ids:
+                    collect(child, child_ids)
+
+        collect(cls, [id])
+        deleted = 0
+        conn = self.__session.connection()
+        for cls, ids in reversed(doomed):
+            for i in range(0, len(ids), chunk_size):
+                chunk = ids[i:i + chunk_size]
+                if cls is Roadmap:
+                    changes = counters.count_rows(conn, Roadmap.id.in_(chunk))
+                deleted = self.__session.execute(
+                    delete(cls).where(cls.id.in_(chunk))
+                ).rowcount
+                if cls is Roadmap:
+                    counters.apply(conn, changes)
+            for id in ids:
+                self.evict(key=f"{cls.__name__}.{id}")
+        return deleted == 1
+
     def reload(self):
-        """Reloads an object """
-        Base.metadata.create_all(self.__engine)
+        """Creates the session registry.
+
+        The registry hands every thread (or greenlet, under a patched
+        threading module) its own session; all methods go through it,
+        so concurrent requests never share a session. No connection is
+        made until the first query; see init_schema() for the tables.
+        """
         sec = sessionmaker(bind=self.__engine, expire_on_commit=False)
-        Session = scoped_session(sec)
-        self.__session = Session()
+        counters.track(sec)
+        self.__session = scoped_session(sec)
+
+    def init_schema(self):
+        """Creates the missing tables, applies the migrations and creates
+        the missing indexes. In the test environment (RDMP_ENV=test) all
+        tables are dropped first. Run once when deploying or starting the
+        app, not on every import"""
+        if os.getenv('RDMP_ENV') == 'test':
+            Base.metadata.drop_all(self.__engine)
+        Base.metadata.create_all(self.__engine)
+        self.migrate_roadmap_status()
+        self.migrate_dashboard_counters()
+        self.sync_indexes()
+
+    def migrate_roadmap_status(self):
+        """Moves the status of roadmaps from the planning, in_progress and
+        completed boolean columns of earlier versions to the status
+        column, then drops the boolean columns. Each step is repeated
+        while the boolean columns remain, so a migration interrupted
+        between statements finishes on the next run; returns whether
+        there was anything to migrate"""
+        with self.__engine.begin() as conn:
+            columns = {column['name']
+                       for column in inspect(conn).get_columns('roadmap')}
+            legacy = [name for name in Roadmap.STATUSES if name in columns]
+            if not legacy:
+                return False
+            if 'status' not in columns:
+                conn.execute(text(
+                    "ALTER TABLE roadmap ADD COLUMN status SMALLINT NOT NULL "
+                    f"DEFAULT {Roadmap.PLANNING}"))
+            # once a boolean column is dropped the backfill has committed
+            if len(legacy) == len(Roadmap.STATUSES):
+                conn.execute(text(
+                    "UPDATE roadmap SET status = CASE "
+                    f"WHEN completed THEN {Roadmap.COMPLETED} "
+                    f"WHEN in_progress THEN {Roadmap.IN_PROGRESS} "
+                    f"ELSE {Roadmap.PLANNING} END"))
+            for name in legacy:
+                conn.execute(text(f"ALTER TABLE roadmap DROP COLUMN {name}"))
+        return True
+
+    def migrate_dashboard_counters(self):
+        """Turns the dashboard table of earlier versions, whose counters
+        were never filled in, into per-user counters: adds the user_id
+        column, lets roadmap_id be empty (on databases other than MySQL
+        by recreating the table) and counts every user's roadmaps. Does
+        nothing if the table already has user_id; returns whether the
+        migration ran"""
+        with self.__engine.begin() as conn:
+            columns = {column['name']
+                       for column in inspect(conn).get_columns('dashboard')}
+            if 'user_id' in columns:
+                return False
+            if conn.dialect.name == 'mysql':
+                conn.execute(text(
+                    "ALTER TABLE dashboard ADD COLUMN user_id VARCHAR(60) "
+                    "NULL, MODIFY roadmap_id VARCHAR(60) NULL"))
+            else:
+                # columns cannot be made nullable in place elsewhere (e.g.
+                # SQLite); the old rows hold nothing worth keeping
+                Dashboard.__table__.drop(conn)
+                Dashboard.__table__.create(conn)
+            counters.rebuild(conn)
+        return True
+
+    def sync_indexes(self):
+        """Creates the indexes declared on the models that are missing
+        from an existing database.
+
+        create_all() only creates indexes together with new tables, so
+        this is the migration path for databases created before an
+        index was added. Returns the names of the indexes created.
+        """
+        created = []
+        with self.__engine.begin() as conn:
+            inspector = inspect(conn)
+            tables = set(inspector.get_table_names())
+            for table in Base.metadata.sorted_tables:
+                if table.name not in tables:
+                    continue
+                existing = {index['name']
+                            for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing:
+                        index.create(conn)
+                        created.append(index.name)
+        return created
 
     def close(self):
-        """Close working SQLAlchemy session"""
-        self.__session.close()
+        """Closes the calling thread's session and removes it from the
+        registry, returning its connection to the pool"""
+        self.__session.remove()
 
@@ -0,0 +1,25 @@
+#!/usr/bin/python3
+""" """
+from models.basemodel import BaseModel, Base
+from sqlalchemy import Column, String, Text, Integer, Index
+
+
+class Job(BaseModel, Base):
+    """A roadmap generation request handled in the background"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index('ix_jobs_status_updated_at', 'status', 'updated_at'),
+    )
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    # job workers in other processes update jobs all the time, so reads
+    # must not be served from the object cache
+    cached = False
+
+    prompt = Column(Text, nullable=False)
+    status = Column(String(16), nullable=False, default=QUEUED)
+    progress = Column(Integer, nullable=False, default=0)
+    roadmap_id = Column(String(60), nullable=True)
+    error = Column(Text, nullable=True)
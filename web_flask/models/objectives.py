@@ -1,12 +1,15 @@
 #!/usr/bin/python3
 """ """
 from models.basemodel import BaseModel, Base
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Column, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 class Objectives(BaseModel, Base):
     """ """
     __tablename__ = "objectives"
+    __table_args__ = (
+        Index('ix_objectives_topic_id', 'topic_id'),
+    )
     name = Column(String(1024), nullable=False)
     topic_id = Column(String(60), ForeignKey('topics.id'), nullable=False)
 
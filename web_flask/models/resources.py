@@ -1,11 +1,14 @@
 #!/usr/bin/python3
 """ """
 from models.basemodel import BaseModel, Base
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Column, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 class Resources(BaseModel, Base):
     """ """
     __tablename__ = "resources"
+    __table_args__ = (
+        Index('ix_resources_topic_id', 'topic_id'),
+    )
     link = Column(String(1024), nullable=False)
     topic_id = Column(String(60), ForeignKey('topics.id'), nullable=False)
@@ -1,11 +1,14 @@
 #!/usr/bin/python3
 """ """
 from models.basemodel import BaseModel, Base
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Column, String, ForeignKey, Index
 
 
 class Review(BaseModel, Base):
     """ """
     __tablename__ = "reviews"
+    __table_args__ = (
+        Index('ix_reviews_user_id', 'user_id'),
+    )
     user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
     text = Column(String(1024), nullable=False)
@@ -1,20 +1,68 @@
 #!/usr/bin/python3
 """ """
 from models.basemodel import BaseModel, Base
-from sqlalchemy import Column, String, Text, JSON, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Text, JSON, ForeignKey, SmallInteger
+from sqlalchemy import Index
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship, validates
+
+
+def status_flag(code):
+    """Returns a hybrid property telling whether a roadmap has a status.
+    Setting it to a true value moves the roadmap to that status; a false
+    value cannot clear the status the roadmap has"""
+    def fget(self):
+        return self.status == code
+
+    def fset(self, value):
+        if value:
+            self.status = code
+        elif self.status == code:
+            raise ValueError(f"roadmap is {Roadmap.STATUSES[code]}; "
+                             "set another status instead")
+
+    def expr(cls):
+        return cls.status == code
+
+    return hybrid_property(fget, fset, expr=expr)
+
 
 class Roadmap(BaseModel, Base):
     """ """
     __tablename__ = "roadmap"
+    __table_args__ = (
+        Index('ix_roadmap_created_at_id', 'created_at', 'id'),
+        Index('ix_roadmap_user_id_created_at', 'user_id', 'created_at'),
+        Index('ix_roadmap_user_id_status_created_at',
+              'user_id', 'status', 'created_at'),
+    )
+    # values of status, in the order of STATUSES
+    PLANNING = 0
+    IN_PROGRESS = 1
+    COMPLETED = 2
+    STATUSES = ('planning', 'in_progress', 'completed')
+
     user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
     title = Column(String(1024), nullable=False)
     introduction = Column(Text, nullable=False)
     AdditionalInfo = Column(JSON, nullable=True)
 
-    planning = Column(Boolean, nullable=False, default=False)
-    in_progress = Column(Boolean, nullable=False, default=False)
-    completed = Column(Boolean, nullable=False, default=False)
+    status = Column(SmallInteger, nullable=False, default=PLANNING)
+
+    # the boolean columns of earlier versions, now views of status
+    planning = status_flag(PLANNING)
+    in_progress = status_flag(IN_PROGRESS)
+    completed = status_flag(COMPLETED)
+
+    topic = relationship('Topic', cascade='all, delete-orphan', backref='roadmap',
+                         order_by='Topic.position')
+    dashboard = relationship('Dashboard', cascade='all, delete-orphan', backref='roadmap')
 
-    topic = relationship('Topic', cascade='all, delete-orphan', backref='roadmap')
-    dashboard = relationship('Dashboard', cascade='all, delete-orphan', backref='roadmap') 
+    @validates('status')
+    def validate_status(self, key, status):
+        """Rejects status codes that are not in STATUSES"""
+        if status not in range(len(self.STATUSES)):
+            raise ValueError(f"invalid status {status!r}, expected one of "
+                             f"0-{len(self.STATUSES) - 1} "
+                             f"({', '.join(self.STATUSES)})")
+        return status 
@@ -1,12 +1,15 @@
 #!/usr/bin/python3
 """ """
 from models.basemodel import BaseModel, Base
-from sqlalchemy import Column, String, Text, ForeignKey, Integer
+from sqlalchemy import Column, String, Text, ForeignKey, Integer, Index
 from sqlalchemy.orm import relationship
 
 class Topic(BaseModel, Base):
     """ """
     __tablename__ = "topics"
+    __table_args__ = (
+        Index('ix_topics_roadmap_id_position', 'roadmap_id', 'position'),
+    )
     roadmap_id = Column(String(60), ForeignKey('roadmap.id'), nullable=False)
     name = Column(String(1024), nullable=False)
     description = Column(Text, nullable=False)
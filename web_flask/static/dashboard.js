@@ -21,25 +21,31 @@ $(document).ready(function() {
         }
     });
 
-    // Function to count the elements in one column
-    function displayCount() {
-        // Store each of the elements in variables
-        var planningTags = document.querySelectorAll('[id^="planning_"]');
-        var inProgressTags = document.querySelectorAll('[id^="inProgress_"]');
-        var completedTags = document.querySelectorAll('[id^="completed_"]');
+    // Function to move one roadmap between the column counts, which the
+    // server renders for all of the user's roadmaps, not just this page
+    function moveCount(from, to) {
+        if (from === to) {
+            return;
+        }
+        var fromCount = document.getElementById(from + "Count");
+        var toCount = document.getElementById(to + "Count");
+        fromCount.textContent = parseInt(fromCount.textContent) - 1;
+        toCount.textContent = parseInt(toCount.textContent) + 1;
+    }
 
-        // Count each of the columns
-        var count1 = planningTags.length;
-        var count2 = inProgressTags.length;
-        var count3 = completedTags.length;
 
-        // Display the final count of each column
-        document.getElementById("planningCount").textContent = count1;
-        document.getElementById("in_progressCount").textContent = count2;
-        document.getElementById("completedCount").textContent = count3;
+    // Function to save the new status of a moved roadmap
+    function saveStatus(r_id, status) {
+        $.ajax({
+            url: '/update_roadmap_status/' + r_id,
+            type: 'PUT',
+            contentType: 'application/json',
+            data: JSON.stringify({ new_status: status }),
+            error: function(xhr) {
+                console.log('Could not save the roadmap status: ' + xhr.status);
+            }
+        });
     }
-    displayCount();
-
 
     // Function to handle drag events
     function dragAndDrop() {
@@ -47,37 +53,46 @@ $(document).ready(function() {
         $(".planning, .in_progress, .completed").on("dragstart", function(e) {
             let selected = $(this);
             r_id = selected.attr('id').split('_')[1];
+            let from = ['planning', 'in_progress', 'completed'].find(function(status) {
+                return selected.hasClass(status);
+            });
 
             // Prevent default behavior for dragover
-            $(".planningColumn, .inProgressColumn, .completedColumn").on("dragover", function(e) {
+            $(".planningColumn, .inProgressColumn, .completedColumn").off("dragover").on("dragover", function(e) {
                 e.preventDefault();
             });
             
-            // Append the selected element to the target column on drop
-            $(".planningColumn").on("drop", function(e) {
+            // Append the selected element to the target column on drop;
+            // handlers are rebound on each drag so only this card moves
+            $(".planningColumn").off("drop").on("drop", function(e) {
                 selected.attr('id', 'planning_' + r_id);
                 selected.removeClass('planning in_progress completed').addClass('planning');
                 $(".planningColumn").append(selected);
+                saveStatus(r_id, 'planning');
+                moveCount(from, 'planning');
                 selected = null;
             });
 
-            $(".inProgressColumn").on("drop", function(e) {
+            $(".inProgressColumn").off("drop").on("drop", function(e) {
                 selected.attr('id', 'inProgress_' + r_id);
                 selected.removeClass('planning in_progress completed').addClass('in_progress');
                 $(".inProgressColumn").append(selected);
+                saveStatus(r_id, 'in_progress');
+                moveCount(from, 'in_progress');
                 selected = null;
             });
 
-            $(".completedColumn").on("drop", function(e) {
+            $(".completedColumn").off("drop").on("drop", function(e) {
                 selected.attr('id', 'completed_' + r_id);
                 selected.removeClass('planning in_progress completed').addClass('completed');
                 $(".completedColumn").append(selected);
+                saveStatus(r_id, 'completed');
+                moveCount(from, 'completed');
                 selected = null;
             });
         });
     }
     dragAndDrop();
-    displayCount();
 });
 
 // $(document).ready(function () {
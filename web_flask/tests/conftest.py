@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+"""Fixtures running DBStorage against an SQLite file instead of MySQL"""
+import os
+import sys
+
+import pytest
+import sqlalchemy
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.engine import db_storage  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """The SQLite engine DBStorage gets in place of its MySQL one"""
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'rdmp.db'}")
+    monkeypatch.setattr(db_storage, 'create_engine',
+                        lambda url, **kwargs: engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def storage(engine, monkeypatch):
+    """A DBStorage with its schema created and no object cache"""
+    monkeypatch.setenv('RDMP_OBJECT_CACHE', 'none')
+    storage = db_storage.DBStorage()
+    storage.reload()
+    storage.init_schema()
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def statements(engine):
+    """The (statement, parameters) pairs sent to the database"""
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield recorded
+    event.remove(engine, 'before_cursor_execute', record)
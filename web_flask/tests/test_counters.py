@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+"""Tests of the dashboard counters"""
+import threading
+from datetime import datetime
+
+from models.dashboard import Dashboard
+from models.engine import counters, db_storage
+from models.roadmap import Roadmap
+from models.user import User
+
+
+def add_roadmap(storage, user_id, **kwargs):
+    """Saves a roadmap of a user, returning it"""
+    roadmap = Roadmap(user_id=user_id, title='t', introduction='i', **kwargs)
+    storage.new(roadmap)
+    storage.save()
+    return roadmap
+
+
+def test_first_roadmap_creates_the_counters(storage):
+    user = User(email='a', password='b', name='c')
+    storage.new(user)
+    storage.save()
+    add_roadmap(storage, user.id)
+    add_roadmap(storage, user.id, completed=True)
+
+    assert storage.dashboard_counts(user.id) == {
+        'planning': 1, 'in_progress': 0, 'completed': 1}
+
+
+def test_upsert_adds_to_counters_created_concurrently(storage, engine):
+    user = User(email='a', password='b', name='c')
+    storage.new(user)
+    storage.save()
+    add_roadmap(storage, user.id)
+
+    # a transaction whose UPDATE ran before the row above was committed
+    with engine.begin() as conn:
+        counters.upsert(conn, user.id, {'planning': Dashboard.planning + 1},
+                        datetime.now())
+
+    storage.close()
+    assert storage.dashboard_counts(user.id) == {
+        'planning': 2, 'in_progress': 0, 'completed': 0}
+    assert storage.count('Dashboard') == 1
+
+
+def test_show_reads_current_counters(storage, monkeypatch):
+    monkeypatch.setenv('RDMP_OBJECT_CACHE', 'memory')
+    cached = db_storage.DBStorage()
+    cached.reload()
+    user = User(email='a', password='b', name='c')
+    storage.new(user)
+    storage.save()
+    add_roadmap(storage, user.id)
+    dashboard_id = next(iter(storage.all('Dashboard').values())).id
+
+    assert cached.show('Dashboard', dashboard_id).planning == 1
+    add_roadmap(storage, user.id)
+    cached.close()
+    assert cached.show('Dashboard', dashboard_id).planning == 2
+
+
+def test_concurrent_first_roadmaps_of_a_user(storage):
+    user = User(email='a', password='b', name='c')
+    storage.new(user)
+    storage.save()
+    start = threading.Barrier(2)
+    errors = []
+
+    def save_roadmap():
+        start.wait()
+        try:
+            add_roadmap(storage, user.id)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            storage.close()
+
+    threads = [threading.Thread(target=save_roadmap) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert storage.dashboard_counts(user.id) == {
+        'planning': 2, 'in_progress': 0, 'completed': 0}
+    assert storage.count('Dashboard') == 1
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+"""Tests of the queries DBStorage sends to the database"""
+import pytest
+import sqlalchemy
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool, StaticPool
+
+from models.basemodel import Base
+from models.engine import db_storage
+from models.objectives import Objectives
+from models.resources import Resources
+from models.roadmap import Roadmap
+from models.topics import Topic
+from models.user import User
+
+# the classes fetch() looks up by parent id
+FETCH_CLASSES = ['Topic', 'Dashboard', 'Roadmap', 'Review', 'Objectives',
+                 'Resources']
+
+
+def query_plan(engine, statement, parameters):
+    """Returns the details of the SQLite query plan of a statement"""
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement,
+                                    parameters)
+        return [row[3] for row in rows]
+
+
+def test_sync_indexes_creates_missing_indexes(storage, engine):
+    declared = {index.name for table in Base.metadata.sorted_tables
+                for index in table.indexes}
+    with engine.begin() as conn:
+        for name in declared:
+            conn.execute(text(f'DROP INDEX {name}'))
+
+    assert set(storage.sync_indexes()) == declared
+    assert storage.sync_indexes() == []
+
+
+@pytest.mark.parametrize('cls', FETCH_CLASSES)
+def test_fetch_uses_an_index(storage, engine, statements, cls):
+    storage.fetch(cls, 'parent-id')
+
+    assert len(statements) == 1
+    plan = query_plan(engine, *statements[0])
+    assert any(step.startswith('SEARCH') and 'USING' in step
+               and 'INDEX' in step for step in plan), plan
+
+
+def test_all_filters_only_the_classes_with_the_columns(storage):
+    user = User(email='a', password='b', name='c')
+    storage.new(user)
+    storage.new(Roadmap(user_id=user.id, title='t', introduction='i'))
+    storage.save()
+
+    objects = storage.all(where={'user_id': user.id})
+    assert {key.split('.')[0] for key in objects} == {'Roadmap', 'Dashboard'}
+    assert storage.all(where={'no_such_column': 1}) == {}
+
+
+@pytest.mark.parametrize('n_topics', [1, 15])
+def test_load_roadmap_graph_runs_four_queries(storage, statements, n_topics):
+    user = User(email='a', password='b', name='c')
+    roadmap = Roadmap(user_id=user.id, title='t', introduction='i')
+    for position in range(n_topics):
+        topic = Topic(name=f'topic {position}', description='d',
+                      milestones='m', position=position)
+        topic.objectives.append(Objectives(name='o'))
+        topic.resources.append(Resources(link='l'))
+        roadmap.topic.append(topic)
+    storage.new(user)
+    storage.new(roadmap)
+    storage.save()
+    storage.close()
+    statements.clear()
+
+    loaded = storage.load_roadmap_graph(roadmap.id)
+    names = [(topic.name, [o.name for o in topic.objectives],
+              [r.link for r in topic.resources]) for topic in loaded.topic]
+
+    assert len(names) == n_topics
+    assert len(statements) == 4
+
+
+def test_all_orders_only_pages(storage, statements):
+    list(storage.all('Topic', lazy=True))
+    storage.all('Topic', limit=10, offset=10)
+
+    assert 'ORDER BY' not in statements[0][0]
+    assert 'ORDER BY' in statements[1][0]
+    with pytest.raises(ValueError):
+        storage.all(offset=10)
+
+
+def test_pool_stats_of_a_queue_pool(storage):
+    storage.count('User')
+    stats = storage.pool_stats()
+
+    assert stats['type'] == 'QueuePool'
+    assert stats['size'] == 5 and stats['pre_ping'] is True
+    assert stats['checkouts'] >= 1 and 'checked_out' in stats
+
+
+@pytest.mark.parametrize('poolclass', [NullPool, StaticPool])
+def test_pool_stats_of_other_pools(tmp_path, monkeypatch, poolclass):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'rdmp.db'}",
+                                      poolclass=poolclass)
+    monkeypatch.setattr(db_storage, 'create_engine',
+                        lambda url, **kwargs: engine)
+    monkeypatch.setenv('RDMP_OBJECT_CACHE', 'none')
+    monkeypatch.setenv('RDMP_POOL_SIZE', '3')
+    storage = db_storage.DBStorage()
+    storage.reload()
+    storage.init_schema()
+    storage.count('User')
+    stats = storage.pool_stats()
+    storage.close()
+
+    assert stats['type'] == poolclass.__name__
+    assert stats['size'] == 3 and stats['checkouts'] >= 1
+    assert 'checked_out' not in stats